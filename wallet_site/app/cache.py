@@ -0,0 +1,111 @@
+# cache.py  —— 进程内按 owner 分区的读缓存（TTL + LRU）
+# 列表类查询按 (owner, 参数) 缓存；该 owner 的数据有写入时整组失效
+# 每个 worker 进程各有一份缓存，跨进程的写入最多在 TTL 之后可见
+import os
+import time
+import functools
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# 缓存配置（环境变量）：
+#   WALLET_CACHE_TTL      条目有效期（秒），0 关闭缓存
+#   WALLET_CACHE_OWNERS   最多缓存多少个用户，超出按最近最少使用淘汰
+#   WALLET_CACHE_ENTRIES  每个用户最多缓存多少组参数（分页 / 过滤组合）
+CACHE_TTL     = float(os.getenv("WALLET_CACHE_TTL", "30"))
+CACHE_OWNERS  = int(os.getenv("WALLET_CACHE_OWNERS", "1024"))
+CACHE_ENTRIES = int(os.getenv("WALLET_CACHE_ENTRIES", "64"))
+
+
+def _freeze(value: Any) -> Hashable:
+    """把 list / dict 参数转成可哈希的 key"""
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(_freeze(v) for v in value)
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    return value
+
+
+class OwnerCache:
+    """{owner: {key: (过期时间, 值)}}，owner 与 key 两级都按 LRU 淘汰
+    线程安全：同步接口在 DB 线程池里并发调用。返回的是共享对象，调用方不要修改"""
+
+    def __init__(self, name: str, ttl: float = CACHE_TTL,
+                 max_owners: int = CACHE_OWNERS, max_entries: int = CACHE_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_owners = max_owners
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, OrderedDict[Hashable, Tuple[float, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0     # 每次失效递增，用于丢弃查询期间发生过失效的结果
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, owner: str, key: Hashable) -> Tuple[bool, Any]:
+        """➜ (命中, 值)"""
+        now = time.monotonic()
+        with self._lock:
+            entries = self._data.get(owner)
+            if entries is not None and key in entries:
+                expires, value = entries[key]
+                if expires > now:
+                    self._data.move_to_end(owner)
+                    entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, owner: str, key: Hashable, value: Any):
+        if self.ttl <= 0:
+            return
+        with self._lock:
+            entries = self._data.get(owner)
+            if entries is None:
+                entries = self._data[owner] = OrderedDict()
+            self._data.move_to_end(owner)
+            entries[key] = (time.monotonic() + self.ttl, value)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            while len(self._data) > self.max_owners:
+                self._data.popitem(last=False)
+
+    def invalidate(self, owner: Optional[str] = None):
+        """清掉某个 owner 的全部条目；owner 为 None 时清空"""
+        with self._lock:
+            self._generation += 1
+            if owner is None:
+                self._data.clear()
+            else:
+                self._data.pop(owner, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"name": self.name, "owners": len(self._data),
+                    "entries": sum(len(e) for e in self._data.values()),
+                    "hits": self.hits, "misses": self.misses}
+
+    def cached(self, fn: Callable) -> Callable:
+        """装饰器：第一个参数为 owner，其余参数组成 key
+        查询进行中发生过失效时，结果可能是旧的，不写入缓存"""
+        @functools.wraps(fn)
+        def wrapper(owner: str, *args, **kwargs):
+            key = (fn.__qualname__, _freeze(args), _freeze(kwargs))
+            hit, value = self.get(owner, key)
+            if hit:
+                return value
+            generation = self._generation
+            value = fn(owner, *args, **kwargs)
+            if self._generation == generation:
+                self.set(owner, key, value)
+            return value
+        return wrapper
+
+
+# 钱包列表 / 按 id 取钱包（转账准备）；钱包增删改、余额写回时失效
+wallet_cache = OwnerCache("wallets")
+# 生成任务列表；任务创建 / 状态变化时失效
+job_cache = OwnerCache("jobs")
@@ -1,42 +1,132 @@
 from pathlib import Path
-from bulk_generate import batch_generate
-from app.service import add_job
-from app.wallet_service import add_wallet
-import uuid, tempfile, json, base58
+from bulk_generate import batch_generate, default_procs, pubkey_of, VanityPattern
+from keypack import KeyPack, pack_path, keygen_entries
+from app.service import add_job, update_job, get_job, mark_persisted
+from app.wallet_service import add_wallets_bulk, create_wallet_seed, get_wallet_seed
+import os, time, uuid, tempfile, logging, base58
 
-def generate_wallets(args: dict, owner: str):
+logger = logging.getLogger(__name__)
+
+MAX_VANITY_LEN = 5   # 前缀 + 后缀总长度上限，每多一位期望尝试次数 ×58
+CHECKPOINT_EVERY = 10000   # 每入库这么多个钱包提交一次检查点
+FLUSH_INTERVAL = 1.0       # 放行后最迟多少秒入库
+
+# 任务输出目录；需要跨重启续跑时应指向持久化磁盘而不是 /tmp
+JOB_ROOT = Path(os.getenv("WALLET_JOB_DIR", tempfile.gettempdir()))
+
+def job_dir(job_id: str) -> Path:
+    return JOB_ROOT / f"wallet_job_{job_id}"
+
+def create_generate_job(args: dict, owner: str) -> str:
+    """
+    登记一个排队中的生成任务 → 返回 job_id
+    """
+    if args.get("vanity_prefix") or args.get("vanity_suffix"):
+        pattern = VanityPattern(args.get("vanity_prefix") or "", args.get("vanity_suffix") or "")
+        if len(pattern.prefix) + len(pattern.suffix) > MAX_VANITY_LEN:
+            raise ValueError(f"靓号前缀 + 后缀不能超过 {MAX_VANITY_LEN} 个字符")
+        if args.get("hd"):
+            raise ValueError("靓号搜索不能与 HD 模式同时使用")
+
+    job_id = uuid.uuid4().hex[:8]
+    # 进程数不超过本机核数
+    args["procs"] = max(1, min(args.get("procs") or default_procs(), default_procs()))
+    if args.get("hd"):
+        # HD 模式：任务只关联一个主种子，钱包行只存派生序号
+        args["seed_id"] = create_wallet_seed(owner)
+    add_job(job_id, job_dir(job_id), args["num"], args, owner, status="queued")
+    return job_id
+
+def run_generate_job(job_id: str, args: dict, owner: str, report=None):
     """
-    生成钱包 → 写数据库 → 返回 (job_id, pubkeys, out_dir)
+    生成钱包 → 写数据库 → 校验打包文件；每个阶段通过 report(fields) 上报进度并写回 Job
+    可重复调用：打包文件从已提交记录数续写，入库从 Job.persisted 检查点继续
     """
-    job_id  = uuid.uuid4().hex[:8]
-    out_dir = Path(tempfile.gettempdir()) / f"wallet_job_{job_id}"
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    pubkeys = batch_generate(
-        total=args["num"],
-        min_d=args["min_delay"],
-        max_d=args["max_delay"],
-        workers=args["workers"],
-        out_dir=str(out_dir),
-    )
-
-    # 将生成的钱包保存到数据库
-    for idx, pubkey in enumerate(pubkeys):
-        # 读取生成的钱包文件
-        info_file = out_dir / f"wallet_{idx}_info.json"
-        if info_file.exists():
-            with open(info_file, 'r') as f:
-                wallet_info = json.load(f)
-                secret_key_b58 = wallet_info.get("secret_key_base58")
-                
-                # 保存到数据库
-                add_wallet(
-                    public_key=pubkey,
-                    secret_key=secret_key_b58,
-                    owner=owner,
-                    name=f"Generated #{idx+1}",
-                    source="generated"
-                )
-
-    add_job(job_id, out_dir, len(pubkeys), args, owner)
-    return job_id, pubkeys, out_dir            # ★ 现在返回 3 个值
\ No newline at end of file
+    def _progress(_persist=True, **fields):
+        if _persist:
+            update_job(job_id, **fields)
+        if report:
+            report(fields)
+
+    out_dir = job_dir(job_id)
+    vanity = None
+    if args.get("vanity_prefix") or args.get("vanity_suffix"):
+        vanity = VanityPattern(args.get("vanity_prefix") or "", args.get("vanity_suffix") or "")
+    seed_id = args.get("seed_id")
+    try:
+        hd_seed = get_wallet_seed(seed_id) if seed_id else None
+        job = get_job(job_id)
+        if job.persisted and not Path(pack_path(out_dir)).exists():
+            raise RuntimeError("打包文件丢失，无法从检查点续跑")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        _progress(status="running")
+        if job.generated or job.persisted:
+            logger.info(f"生成任务 {job_id} 从检查点继续：已生成 {job.generated}，已入库 {job.persisted}")
+
+        # 生成全速进行；钱包按 min/max 间隔放行，放行后攒批入库：
+        # 每批 ≤ CHECKPOINT_EVERY 个一个事务，检查点与钱包行同事务提交，重启后不会重复入库
+        persisted, flushed_at = job.persisted, time.monotonic()
+
+        def _persist(stop: int):
+            nonlocal persisted, flushed_at
+            flushed_at = time.monotonic()
+            if stop <= persisted:
+                return
+            with KeyPack(pack_path(out_dir)) as pack:
+                for lo in range(persisted, stop, CHECKPOINT_EVERY):
+                    hi = min(lo + CHECKPOINT_EVERY, stop)
+                    add_wallets_bulk((
+                        {
+                            "public_key": pubkey_of(secret),
+                            **({"seed_id": seed_id, "derivation_index": idx} if seed_id
+                               else {"secret_key": base58.b58encode(secret).decode()}),
+                            "name": f"Generated #{idx+1}",
+                            "source": "generated",
+                        }
+                        for idx, secret in pack.iter_secrets(lo, hi)
+                    ), owner, before_commit=lambda ses, hi=hi: mark_persisted(ses, job_id, hi))
+                    persisted = hi
+                    _progress(False, persisted=hi)
+
+        def _on_release(released: int):
+            if (released - persisted >= CHECKPOINT_EVERY
+                    or time.monotonic() - flushed_at >= FLUSH_INTERVAL):
+                _persist(released)
+
+        count = batch_generate(
+            total=args["num"],
+            min_d=args["min_delay"],
+            max_d=args["max_delay"],
+            workers=args["workers"],
+            out_dir=str(out_dir),
+            procs=args["procs"],
+            on_progress=lambda n: _progress(generated=n),
+            vanity=vanity,
+            on_stats=lambda st: _progress(False, **st),   # 靓号尝试速度 / ETA 只推送
+            resume=True,
+            on_release=_on_release,
+            released=job.persisted,
+            hd_seed=hd_seed,
+        )
+        _progress(generated=count)
+        _persist(count)
+
+        # 下载时直接从 wallets.pack 流式打包，这里只确认打包文件完整可读
+        with KeyPack(pack_path(out_dir)) as pack:
+            _progress(archived=len(pack))
+        _progress(status="completed", count=count)
+    except Exception as e:
+        logger.error(f"生成任务 {job_id} 失败: {e}", exc_info=True)
+        _progress(status="failed", error_message=str(e))
+
+def job_zip_entries(dir_path: Path):
+    """任务的下载条目 (文件名, 内容)：有 wallets.pack 时按需生成 solana-keygen 文件，
+    旧任务目录则逐个读取其中的文件"""
+    pack_file = Path(pack_path(dir_path))
+    if pack_file.exists():
+        with KeyPack(str(pack_file)) as pack:
+            yield from keygen_entries(pack)
+    else:
+        for fp in sorted(dir_path.rglob("*")):
+            if fp.is_file():
+                yield str(fp.relative_to(dir_path)), fp.read_bytes()
@@ -0,0 +1,167 @@
+import os
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Set
+
+from app.generator import create_generate_job, run_generate_job
+from app.service import claim_job, touch_job, list_resumable_jobs
+from app.db import run_db
+
+logger = logging.getLogger(__name__)
+
+# 同时运行的生成任务数 / 允许排队的任务数（可以通过环境变量配置）
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+MAX_QUEUED_JOBS = int(os.getenv("MAX_QUEUED_JOBS", "32"))
+# 运行中任务的租约：超过这么久没有心跳就视为工作进程已退出，可以被接管续跑
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "120"))
+
+TERMINAL_STATES = ("completed", "failed")
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class ProgressHub:
+    """任务进度广播：工作线程 publish，WebSocket 连接各自持有一个 asyncio.Queue"""
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subs: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        # 只在事件循环里调用
+        self._loop = asyncio.get_running_loop()
+        q: asyncio.Queue = asyncio.Queue()
+        self._subs[job_id].add(q)
+        return q
+
+    def unsubscribe(self, job_id: str, q: asyncio.Queue):
+        subs = self._subs.get(job_id)
+        if subs is not None:
+            subs.discard(q)
+            if not subs:
+                del self._subs[job_id]
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        """可在任意线程调用"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(self._dispatch, job_id, dict(event, job_id=job_id))
+
+    def _dispatch(self, job_id: str, event: Dict[str, Any]):
+        for q in self._subs.get(job_id, ()):
+            q.put_nowait(event)
+
+
+hub = ProgressHub()
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_pending = 0                  # 本进程已提交、尚未结束的任务数（= 不同任务数）
+_submitted: Set[str] = set()  # 本进程已提交、尚未结束的 job_id，续跑扫描时跳过
+_pending_lock = threading.Lock()
+
+
+def submit_generate(args: dict, owner: str) -> str:
+    """登记任务并放入工作池，立即返回 job_id"""
+    global _pending
+    with _pending_lock:
+        if _pending >= MAX_QUEUED_JOBS:
+            raise QueueFullError("生成任务过多，请稍后再试")
+        _pending += 1
+
+    try:
+        job_id = create_generate_job(args, owner)
+    except Exception:
+        with _pending_lock:
+            _pending -= 1
+        raise
+    with _pending_lock:
+        _submitted.add(job_id)
+    hub.publish(job_id, {"status": "queued"})
+    _executor.submit(_run, job_id, args, owner)
+    return job_id
+
+
+def _run(job_id: str, args: dict, owner: str):
+    global _pending
+    try:
+        stale_before = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+        if not claim_job(job_id, stale_before):
+            return   # 已被其它工作进程认领
+        with _Heartbeat(job_id):
+            run_generate_job(job_id, args, owner,
+                             report=lambda fields: hub.publish(job_id, fields))
+    finally:
+        with _pending_lock:
+            _pending -= 1
+            _submitted.discard(job_id)
+
+
+class _Heartbeat:
+    """任务运行期间定期续租"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._beat, name=f"heartbeat-{job_id}", daemon=True)
+
+    def _beat(self):
+        while not self._stop.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                touch_job(self.job_id)
+            except Exception as e:   # 数据库忙时跳过这一次
+                logger.warning(f"任务 {self.job_id} 续租失败: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def resume_stale_jobs() -> int:
+    """把租约过期的排队 / 运行中任务重新放入工作池，返回数量
+    本进程工作池里已经在排队 / 运行的任务跳过：排队中的任务没有心跳，created 超过租约后看起来也是过期的"""
+    global _pending
+    stale_before = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+    resumed = 0
+    for job in list_resumable_jobs(stale_before):
+        with _pending_lock:
+            if job.id in _submitted:
+                continue
+            _submitted.add(job.id)
+            _pending += 1
+        logger.info(f"续跑生成任务 {job.id}（状态 {job.status}）")
+        _executor.submit(_run, job.id, job.params, job.owner)
+        resumed += 1
+    return resumed
+
+
+async def resume_loop():
+    """启动时及之后每个租约周期扫描一次需要续跑的任务"""
+    while True:
+        try:
+            await run_db(resume_stale_jobs)
+        except Exception as e:
+            logger.error(f"扫描待续跑任务失败: {e}")
+        await asyncio.sleep(JOB_LEASE_SECONDS)
+
+
+def job_snapshot(job) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "count": job.count,
+        "generated": job.generated,
+        "persisted": job.persisted,
+        "archived": job.archived,
+        "error_message": job.error_message,
+    }
@@ -1,55 +1,90 @@
-from fastapi import FastAPI, Form, BackgroundTasks, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Form, Depends, HTTPException, UploadFile, File, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
-import zipfile, logging, json
+import asyncio, logging, json
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 
-from app.generator import generate_wallets
+from app.generator import job_zip_entries
+from app.zipstream import stream_zip
+from app.jobs import submit_generate, QueueFullError, hub, job_snapshot, TERMINAL_STATES, resume_loop
+from keypack import KeyPack, pack_path
 from app.auth import (
     create_nonce, verify_signature, gen_jwt, current_user,
-    consume_nonce, pop_nonce,upsert_user
+    consume_nonce, pop_nonce,upsert_user, decode_jwt
 )
 
-from app.service import list_jobs_by_user
+from app.service import list_jobs_by_user, get_job
 from app.wallet_service import (
-    import_wallets_from_json, get_user_wallets, export_wallets,
+    import_wallets_from_json, list_wallets_page, export_wallets,
     query_balances, delete_wallets, update_wallet_name
 )
-from app.transfer_service import TransferService
+from app.transfer_service import TransferService, archive_loop
+from app.rpc import rpc
 from app.models import Wallet, TransferRecord, BatchTransferTask
+from app.db import get_db, run_db
+from app.migrations import ensure_schema
+from sqlmodel import Session
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="Solana Wallet Generator")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 数据库结构：部署时先运行 python -m app.migrations upgrade（在 wallet_site 目录下）；
+    # 版本落后时启动失败并提示该命令，WALLET_DB_AUTO_MIGRATE=1 时改为就地升级
+    await run_db(ensure_schema)
+    # 共享的 Solana RPC 连接池
+    await rpc.start()
+    # 续跑上次中断的生成任务
+    resume_task = asyncio.create_task(resume_loop())
+    # 定期归档过期的转账记录
+    archive_task = asyncio.create_task(archive_loop())
+    try:
+        yield
+    finally:
+        for task in (resume_task, archive_task):
+            task.cancel()
+        for task in (resume_task, archive_task):
+            with suppress(asyncio.CancelledError):
+                await task
+        await rpc.close()
+
+app = FastAPI(title="Solana Wallet Generator", lifespan=lifespan)
 
 # Pydantic 模型
 class WalletName(BaseModel):
     name: str
 
+# max_staleness：余额缓存可接受的最大陈旧秒数，None 用默认值，0 强制查链上
 class TransferRequest(BaseModel):
     from_address: str
     to_address: str
     amount: float
     memo: Optional[str] = None
+    max_staleness: Optional[float] = None
 
 class BatchTransferRequest(BaseModel):
     from_wallet_ids: List[int]
     to_address: str
     amount_per_wallet: float
     memo: Optional[str] = None
+    max_staleness: Optional[float] = None
 
 class MultipleRecipientTransferRequest(BaseModel):
     from_wallet_ids: List[int]
     recipients: List[Dict[str, Any]]  # [{"address": str, "amount": float}]
     memo: Optional[str] = None
+    max_staleness: Optional[float] = None
 
 class InternalTransferRequest(BaseModel):
     from_wallet_ids: List[int]
     to_wallet_ids: List[int]
     amount_per_wallet: float
     memo: Optional[str] = None
+    max_staleness: Optional[float] = None
 
 class AddressValidation(BaseModel):
     address: str
@@ -62,17 +97,6 @@ class BatchTransferExecution(BaseModel):
     batch_id: str
     results: List[Dict[str, Any]]
 
-# ---------- 工具：把目录打成 zip ----------
-def _zip_dir(dir_path: Path):
-    """若未打包则创建 zip，返回 Path；已存在则直接返回"""
-    zip_path = dir_path.with_suffix(".zip")
-    if zip_path.exists():
-        return zip_path
-    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
-        for fp in dir_path.rglob("*"):
-            zf.write(fp, fp.relative_to(dir_path))
-    return zip_path
-
 # ---------- 静态 & 首页 ----------
 @app.get("/", include_in_schema=False)
 def index():
@@ -105,32 +129,103 @@ async def api_generate(
     min_delay: float = Form(0.1),
     max_delay: float = Form(0.5),
     workers: int = Form(4),
-    background_tasks: BackgroundTasks = BackgroundTasks(),
+    procs: Optional[int] = Form(None),
+    vanity_prefix: Optional[str] = Form(None),
+    vanity_suffix: Optional[str] = Form(None),
+    hd: bool = Form(False),
     user: str = Depends(current_user),
 ):
-    args = dict(num=num, min_delay=min_delay, max_delay=max_delay, workers=workers)
-    job_id, pubkeys, out_dir = generate_wallets(args, user)   # 注意 generator 应返回 out_dir
-    # 后台打 zip
-    background_tasks.add_task(_zip_dir, Path(out_dir))
-    return {"job_id": job_id, "count": len(pubkeys), "pubkeys": pubkeys}
+    """提交生成任务，立即返回 job_id；进度通过 /ws/jobs/{job_id} 推送
+    指定 vanity_prefix / vanity_suffix 时搜索 num 个匹配的靓号地址；
+    hd=true 时从一个主种子派生，数据库只保存派生序号"""
+    args = dict(num=num, min_delay=min_delay, max_delay=max_delay, workers=workers, procs=procs,
+                vanity_prefix=vanity_prefix, vanity_suffix=vanity_suffix, hd=hd)
+    try:
+        job_id = await run_db(submit_generate, args, user)
+    except QueueFullError as e:
+        raise HTTPException(429, str(e))
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {"job_id": job_id, "status": "queued", "count": num}
 
 # ---------- 历史 ----------
 @app.get("/api/jobs")
 def api_jobs(user: str = Depends(current_user)):
     jobs = list_jobs_by_user(user)
     return [
-        {"job_id": j.id, "created": j.created.isoformat(timespec="seconds"), "count": j.count}
+        {"job_id": j.id, "created": j.created.isoformat(timespec="seconds"),
+         "count": j.count, "status": j.status}
         for j in jobs
     ]
 
+PUBKEY_PREVIEW = 1000   # 任务详情里最多返回的公钥数
+
+@app.get("/api/jobs/{job_id}")
+def api_job_status(job_id: str, user: str = Depends(current_user)):
+    """任务状态；完成后附带前 PUBKEY_PREVIEW 个公钥"""
+    job = get_job(job_id)
+    if not job or job.owner != user:
+        raise HTTPException(404, "job_id not found")
+    data = job_snapshot(job)
+    pack_file = Path(pack_path(job.path))
+    if job.status == "completed" and pack_file.exists():
+        with KeyPack(str(pack_file)) as pack:
+            data["pubkeys"] = [pack.pubkey(i) for i in range(min(len(pack), PUBKEY_PREVIEW))]
+    return data
+
+@app.websocket("/ws/jobs/{job_id}")
+async def ws_job_progress(websocket: WebSocket, job_id: str, token: str = ""):
+    """推送任务进度（浏览器无法给 WebSocket 加请求头，token 走查询参数）"""
+    user = decode_jwt(token)
+    job = await run_db(get_job, job_id) if user else None
+    if not job or job.owner != user:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    q = hub.subscribe(job_id)
+    # 同时读客户端消息：任务排队 / 长时间没有进度时，客户端断开也能立刻发现
+    disconnected = asyncio.create_task(_wait_disconnect(websocket))
+    try:
+        # 先订阅再取快照，避免漏掉中间的事件
+        job = await run_db(get_job, job_id)
+        await websocket.send_json(job_snapshot(job))
+        status = job.status
+        while status not in TERMINAL_STATES:
+            next_event = asyncio.ensure_future(q.get())
+            await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                return
+            event = next_event.result()
+            await websocket.send_json(event)
+            status = event.get("status", status)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        hub.unsubscribe(job_id, q)
+
+async def _wait_disconnect(websocket: WebSocket):
+    """丢弃客户端发来的消息，直到连接断开"""
+    while (await websocket.receive())["type"] != "websocket.disconnect":
+        pass
+
 # ---------- 下载 ----------
 @app.get("/download/{job_id}")
-def dl(job_id: str, user: str = Depends(current_user)):
-    jobs = {j.id: j for j in list_jobs_by_user(user)}
-    if job_id not in jobs:
+def dl(job_id: str, compress: bool = True, user: str = Depends(current_user)):
+    """边生成边发送 zip；compress=false 时条目不压缩"""
+    job = get_job(job_id)
+    if not job or job.owner != user:
         raise HTTPException(404, "job_id not found")
-    zip_path = _zip_dir(Path(jobs[job_id].path))
-    return FileResponse(zip_path, filename=zip_path.name, media_type="application/zip")
+    if job.status != "completed":
+        raise HTTPException(409, "任务尚未完成")
+    return StreamingResponse(
+        stream_zip(job_zip_entries(Path(job.path)), compress=compress),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=wallet_job_{job_id}.zip"}
+    )
 
 # ---------- 钱包管理 API ----------
 @app.post("/api/wallets/import")
@@ -145,7 +240,7 @@ async def api_import_wallets(
     try:
         content = await file.read()
         file_content = content.decode('utf-8')
-        imported = import_wallets_from_json(file_content, user)
+        imported = await run_db(import_wallets_from_json, file_content, user)
         
         return {
             "status": "success",
@@ -160,21 +255,38 @@ async def api_import_wallets(
         raise HTTPException(500, "导入失败")
 
 @app.get("/api/wallets")
-def api_get_wallets(user: str = Depends(current_user)):
-    """获取用户的所有钱包"""
-    wallets = get_user_wallets(user)
-    return [
-        {
-            "id": w.id,
-            "public_key": w.public_key,
-            "name": w.name,
-            "source": w.source,
-            "created": w.created.isoformat(timespec="seconds"),
-            "balance": w.balance,
-            "last_checked": w.last_checked.isoformat(timespec="seconds") if w.last_checked else None
-        }
-        for w in wallets
-    ]
+def api_get_wallets(
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    source: Optional[str] = None,
+    name: Optional[str] = None,
+    min_balance: Optional[float] = None,
+    max_balance: Optional[float] = None,
+    user: str = Depends(current_user)
+):
+    """分页获取用户的钱包；next_cursor 为空表示没有更多"""
+    try:
+        wallets, next_cursor = list_wallets_page(
+            user, limit=limit, cursor=cursor, source=source, name=name,
+            min_balance=min_balance, max_balance=max_balance
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return {
+        "items": [
+            {
+                "id": w["id"],
+                "public_key": w["public_key"],
+                "name": w["name"],
+                "source": w["source"],
+                "created": w["created"].isoformat(timespec="seconds"),
+                "balance": w["balance"],
+                "last_checked": w["last_checked"].isoformat(timespec="seconds") if w["last_checked"] else None
+            }
+            for w in wallets
+        ],
+        "next_cursor": next_cursor
+    }
 
 @app.post("/api/wallets/export")
 def api_export_wallets(
@@ -198,13 +310,14 @@ def api_export_wallets(
 @app.post("/api/wallets/balances")
 async def api_query_balances(
     wallet_ids: List[int],
+    max_staleness: Optional[float] = None,
     user: str = Depends(current_user)
 ):
-    """查询选中钱包的余额"""
+    """查询选中钱包的余额；max_staleness 秒内查过的直接用缓存，0 强制刷新"""
     if not wallet_ids:
         raise HTTPException(400, "请选择要查询的钱包")
     
-    balances = await query_balances(wallet_ids, user)
+    balances = await query_balances(wallet_ids, user, max_staleness)
     
     # 计算总余额
     total = sum(b for b in balances.values() if b is not None)
@@ -256,8 +369,8 @@ async def api_validate_address(
     result = {"valid": is_valid}
     
     if is_valid:
-        # 获取地址余额
-        balance = await TransferService.get_balance(data.address)
+        # 获取地址余额（自己的钱包走余额缓存）
+        balance = await TransferService.get_balance(data.address, owner=user)
         result["balance"] = balance
     
     return result
@@ -274,6 +387,10 @@ async def api_prepare_transfer(
     user: str = Depends(current_user)
 ):
     """准备转账交易（返回交易信息，不执行）"""
+    return await _prepare_transfer(data, user)
+
+async def _prepare_transfer(data: TransferRequest, user: str, with_blockhash: bool = False) -> Dict[str, Any]:
+    """with_blockhash：执行接口用，最新区块哈希与余额在同一个批量 RPC 里取回，放在 recent_blockhash"""
     
     # 验证发送方地址
     if not await TransferService.validate_address(data.from_address):
@@ -284,23 +401,22 @@ async def api_prepare_transfer(
         raise HTTPException(400, "无效的接收方地址")
     
     # 检查是否是用户的钱包
-    wallet = TransferService.get_user_wallet_by_address(user, data.from_address)
+    wallet = await run_db(TransferService.get_user_wallet_by_address, user, data.from_address)
     if not wallet:
         raise HTTPException(403, "该钱包不属于当前用户")
     
-    # 获取余额
-    balance = await TransferService.get_balance(data.from_address)
+    # 获取余额、估算手续费
+    fee, blockhash, balances = await TransferService.estimate_fee_and_balances(
+        [wallet], user, data.max_staleness, with_blockhash)
+    balance = balances.get(data.from_address)
     if balance is None:
         raise HTTPException(500, "无法获取钱包余额")
     
-    # 估算手续费
-    fee = await TransferService.estimate_fee()
-    
     # 检查余额是否足够
     if balance < data.amount + fee:
         raise HTTPException(400, f"余额不足。当前余额: {balance:.6f} SOL, 需要: {data.amount + fee:.6f} SOL")
     
-    return {
+    result = {
         "from_address": data.from_address,
         "to_address": data.to_address,
         "amount": data.amount,
@@ -311,6 +427,9 @@ async def api_prepare_transfer(
         "memo": data.memo,
         "wallet_name": wallet.name
     }
+    if with_blockhash:
+        result["recent_blockhash"] = blockhash
+    return result
 
 @app.post("/api/transfer/batch-prepare")
 async def api_prepare_batch_transfer(
@@ -318,18 +437,23 @@ async def api_prepare_batch_transfer(
     user: str = Depends(current_user)
 ):
     """准备批量转账（返回交易信息，不执行）"""
+    return await _prepare_batch_transfer(data, user)
+
+async def _prepare_batch_transfer(data: BatchTransferRequest, user: str, with_blockhash: bool = False) -> Dict[str, Any]:
+    """with_blockhash：执行接口用，最新区块哈希与余额在同一个批量 RPC 里取回，放在 recent_blockhash"""
     
     # 验证接收方地址
     if not await TransferService.validate_address(data.to_address):
         raise HTTPException(400, "无效的接收方地址")
     
     # 获取用户钱包
-    wallets = TransferService.get_user_wallets_by_ids(user, data.from_wallet_ids)
+    wallets = await run_db(TransferService.get_user_wallets_by_ids, user, data.from_wallet_ids)
     if len(wallets) != len(data.from_wallet_ids):
         raise HTTPException(403, "部分钱包不属于当前用户")
     
-    # 估算手续费
-    fee = await TransferService.estimate_fee()
+    # 估算手续费、查询余额（一次批量 RPC）
+    fee, blockhash, balances = await TransferService.estimate_fee_and_balances(
+        wallets, user, data.max_staleness, with_blockhash)
     
     # 检查每个钱包的余额
     transfers = []
@@ -338,7 +462,7 @@ async def api_prepare_batch_transfer(
     insufficient_wallets = []
     
     for wallet in wallets:
-        balance = await TransferService.get_balance(wallet.public_key)
+        balance = balances.get(wallet.public_key)
         if balance is None:
             raise HTTPException(500, f"无法获取钱包 {wallet.public_key} 的余额")
         
@@ -363,7 +487,8 @@ async def api_prepare_batch_transfer(
         
         transfers.append(transfer_info)
     
-    return {
+    result = {
+        "fee": fee,
         "to_address": data.to_address,
         "amount_per_wallet": data.amount_per_wallet,
         "total_wallets": len(wallets),
@@ -375,6 +500,9 @@ async def api_prepare_batch_transfer(
         "transfers": transfers,
         "memo": data.memo
     }
+    if with_blockhash:
+        result["recent_blockhash"] = blockhash
+    return result
 
 @app.post("/api/transfer/batch-prepare-multiple")
 async def api_prepare_multiple_transfer(
@@ -382,6 +510,10 @@ async def api_prepare_multiple_transfer(
     user: str = Depends(current_user)
 ):
     """准备多接收地址批量转账"""
+    return await _prepare_multiple_transfer(data, user)
+
+async def _prepare_multiple_transfer(data: MultipleRecipientTransferRequest, user: str, with_blockhash: bool = False) -> Dict[str, Any]:
+    """with_blockhash：执行接口用，最新区块哈希与余额在同一个批量 RPC 里取回，放在 recent_blockhash"""
     
     # 验证所有接收方地址
     for recipient in data.recipients:
@@ -389,12 +521,13 @@ async def api_prepare_multiple_transfer(
             raise HTTPException(400, f"无效的接收方地址: {recipient['address']}")
     
     # 获取用户钱包
-    wallets = TransferService.get_user_wallets_by_ids(user, data.from_wallet_ids)
+    wallets = await run_db(TransferService.get_user_wallets_by_ids, user, data.from_wallet_ids)
     if len(wallets) != len(data.from_wallet_ids):
         raise HTTPException(403, "部分钱包不属于当前用户")
     
-    # 估算手续费
-    fee = await TransferService.estimate_fee()
+    # 估算手续费、查询余额（一次批量 RPC）
+    fee, blockhash, balances = await TransferService.estimate_fee_and_balances(
+        wallets, user, data.max_staleness, with_blockhash)
     
     # 计算总转账金额和检查余额
     total_amount = sum(r["amount"] for r in data.recipients)
@@ -405,7 +538,7 @@ async def api_prepare_multiple_transfer(
     insufficient_wallets = 0
     
     for wallet in wallets:
-        balance = await TransferService.get_balance(wallet.public_key)
+        balance = balances.get(wallet.public_key)
         if balance is None:
             raise HTTPException(500, f"无法获取钱包 {wallet.public_key} 的余额")
         
@@ -431,7 +564,8 @@ async def api_prepare_multiple_transfer(
     actual_total_amount = successful_wallets * total_amount
     actual_total_fees = successful_wallets * len(data.recipients) * fee
     
-    return {
+    result = {
+        "fee": fee,
         "recipients": data.recipients,
         "total_wallets": len(wallets),
         "sufficient_wallets": successful_wallets,
@@ -442,6 +576,9 @@ async def api_prepare_multiple_transfer(
         "transfers": transfers,
         "memo": data.memo
     }
+    if with_blockhash:
+        result["recent_blockhash"] = blockhash
+    return result
 
 @app.post("/api/transfer/batch-prepare-internal")
 async def api_prepare_internal_transfer(
@@ -449,14 +586,18 @@ async def api_prepare_internal_transfer(
     user: str = Depends(current_user)
 ):
     """准备内部钱包间批量转账"""
+    return await _prepare_internal_transfer(data, user)
+
+async def _prepare_internal_transfer(data: InternalTransferRequest, user: str, with_blockhash: bool = False) -> Dict[str, Any]:
+    """with_blockhash：执行接口用，最新区块哈希与余额在同一个批量 RPC 里取回，放在 recent_blockhash"""
     
     # 获取发送方钱包
-    from_wallets = TransferService.get_user_wallets_by_ids(user, data.from_wallet_ids)
+    from_wallets = await run_db(TransferService.get_user_wallets_by_ids, user, data.from_wallet_ids)
     if len(from_wallets) != len(data.from_wallet_ids):
         raise HTTPException(403, "部分发送方钱包不属于当前用户")
     
     # 获取接收方钱包
-    to_wallets = TransferService.get_user_wallets_by_ids(user, data.to_wallet_ids)
+    to_wallets = await run_db(TransferService.get_user_wallets_by_ids, user, data.to_wallet_ids)
     if len(to_wallets) != len(data.to_wallet_ids):
         raise HTTPException(403, "部分接收方钱包不属于当前用户")
     
@@ -467,8 +608,9 @@ async def api_prepare_internal_transfer(
     if from_addresses & to_addresses:
         raise HTTPException(400, "发送方和接收方钱包不能重叠")
     
-    # 估算手续费
-    fee = await TransferService.estimate_fee()
+    # 估算手续费、查询余额（一次批量 RPC）
+    fee, blockhash, balances = await TransferService.estimate_fee_and_balances(
+        from_wallets, user, data.max_staleness, with_blockhash)
     
     # 计算每个发送方钱包需要的总金额
     amount_per_receiver = data.amount_per_wallet
@@ -481,7 +623,7 @@ async def api_prepare_internal_transfer(
     insufficient_wallets = 0
     
     for wallet in from_wallets:
-        balance = await TransferService.get_balance(wallet.public_key)
+        balance = balances.get(wallet.public_key)
         if balance is None:
             raise HTTPException(500, f"无法获取钱包 {wallet.public_key} 的余额")
         
@@ -505,7 +647,8 @@ async def api_prepare_internal_transfer(
     actual_total_amount = successful_wallets * total_amount_per_sender
     actual_total_fees = successful_wallets * total_fee_per_sender
     
-    return {
+    result = {
+        "fee": fee,
         "internal_wallets": [{"id": w.id, "name": w.name, "address": w.public_key} for w in to_wallets],
         "amount_per_wallet": data.amount_per_wallet,
         "total_wallets": len(from_wallets),
@@ -517,6 +660,9 @@ async def api_prepare_internal_transfer(
         "transfers": transfers,
         "memo": data.memo
     }
+    if with_blockhash:
+        result["recent_blockhash"] = blockhash
+    return result
 
 # ---------- 转账执行和记录管理 API ----------
 @app.post("/api/transfer/execute")
@@ -527,10 +673,11 @@ async def api_execute_transfer(
     """执行单笔转账（创建转账记录，前端负责签名和广播）"""
     
     # 验证和准备转账
-    prepare_result = await api_prepare_transfer(data, user)
+    prepare_result = await _prepare_transfer(data, user, with_blockhash=True)
     
     # 创建转账记录
-    transfer_record = TransferService.create_transfer_record(
+    transfer_record = await run_db(
+        TransferService.create_transfer_record,
         owner=user,
         from_address=data.from_address,
         to_address=data.to_address,
@@ -547,8 +694,8 @@ async def api_execute_transfer(
         amount_lamports=int(data.amount * 1e9)
     )
     
-    # 获取最新区块哈希
-    recent_blockhash = await TransferService.get_recent_blockhash()
+    # 最新区块哈希在准备阶段已随余额一起取回
+    recent_blockhash = prepare_result["recent_blockhash"]
     
     return {
         "transfer_id": transfer_record.id,
@@ -566,10 +713,11 @@ async def api_execute_multiple_transfer(
     """执行多接收地址批量转账"""
     
     # 验证和准备批量转账
-    prepare_result = await api_prepare_multiple_transfer(data, user)
+    prepare_result = await _prepare_multiple_transfer(data, user, with_blockhash=True)
     
     # 创建批量转账任务
-    batch_task = TransferService.create_batch_transfer_task(
+    batch_task = await run_db(
+        TransferService.create_batch_transfer_task,
         owner=user,
         to_address=f"多个地址({len(data.recipients)}个)",
         amount_per_wallet=sum(r["amount"] for r in data.recipients),
@@ -579,25 +727,24 @@ async def api_execute_multiple_transfer(
         memo=data.memo
     )
     
-    # 为每个有效钱包和每个接收方创建转账记录
-    transfer_records = []
+    # 为每个有效钱包和每个接收方创建转账记录（一次批量写入）
+    fee = prepare_result["fee"]
+    record_rows = []
     transfer_instructions = []
     
     for transfer_info in prepare_result["transfers"]:
         if transfer_info["sufficient"]:
             for recipient in data.recipients:
-                # 创建转账记录
-                record = TransferService.create_transfer_record(
+                record_rows.append(dict(
                     owner=user,
                     from_address=transfer_info["from_address"],
                     to_address=recipient["address"],
                     amount=recipient["amount"],
-                    fee=await TransferService.estimate_fee(),
+                    fee=fee,
                     memo=data.memo,
                     transfer_type="batch",
                     batch_id=batch_task.id
-                )
-                transfer_records.append(record)
+                ))
                 
                 # 构建转账指令
                 instruction = TransferService.build_transfer_instruction(
@@ -606,14 +753,17 @@ async def api_execute_multiple_transfer(
                     amount_lamports=int(recipient["amount"] * 1e9)
                 )
                 transfer_instructions.append({
-                    "transfer_id": record.id,
                     "wallet_id": transfer_info["wallet_id"],
                     "recipient_address": recipient["address"],
                     "instruction": instruction
                 })
     
-    # 获取最新区块哈希
-    recent_blockhash = await TransferService.get_recent_blockhash()
+    records = await run_db(TransferService.create_transfer_records, record_rows)
+    for item, record in zip(transfer_instructions, records):
+        item["transfer_id"] = record.id
+    
+    # 最新区块哈希在准备阶段已随余额一起取回
+    recent_blockhash = prepare_result["recent_blockhash"]
     
     return {
         "batch_id": batch_task.id,
@@ -631,10 +781,11 @@ async def api_execute_internal_transfer(
     """执行内部钱包间批量转账"""
     
     # 验证和准备内部转账
-    prepare_result = await api_prepare_internal_transfer(data, user)
+    prepare_result = await _prepare_internal_transfer(data, user, with_blockhash=True)
     
     # 创建批量转账任务
-    batch_task = TransferService.create_batch_transfer_task(
+    batch_task = await run_db(
+        TransferService.create_batch_transfer_task,
         owner=user,
         to_address=f"内部钱包({len(data.to_wallet_ids)}个)",
         amount_per_wallet=data.amount_per_wallet,
@@ -645,11 +796,12 @@ async def api_execute_internal_transfer(
     )
     
     # 获取接收方钱包信息
-    to_wallets = TransferService.get_user_wallets_by_ids(user, data.to_wallet_ids)
+    to_wallets = await run_db(TransferService.get_user_wallets_by_ids, user, data.to_wallet_ids)
     to_wallet_map = {w.id: w for w in to_wallets}
     
-    # 为每个有效发送钱包和每个接收钱包创建转账记录
-    transfer_records = []
+    # 为每个有效发送钱包和每个接收钱包创建转账记录（一次批量写入）
+    fee = prepare_result["fee"]
+    record_rows = []
     transfer_instructions = []
     
     for transfer_info in prepare_result["transfers"]:
@@ -657,18 +809,16 @@ async def api_execute_internal_transfer(
             for to_wallet_id in data.to_wallet_ids:
                 to_wallet = to_wallet_map[to_wallet_id]
                 
-                # 创建转账记录
-                record = TransferService.create_transfer_record(
+                record_rows.append(dict(
                     owner=user,
                     from_address=transfer_info["from_address"],
                     to_address=to_wallet.public_key,
                     amount=data.amount_per_wallet,
-                    fee=await TransferService.estimate_fee(),
+                    fee=fee,
                     memo=data.memo,
                     transfer_type="batch",
                     batch_id=batch_task.id
-                )
-                transfer_records.append(record)
+                ))
                 
                 # 构建转账指令
                 instruction = TransferService.build_transfer_instruction(
@@ -677,14 +827,17 @@ async def api_execute_internal_transfer(
                     amount_lamports=int(data.amount_per_wallet * 1e9)
                 )
                 transfer_instructions.append({
-                    "transfer_id": record.id,
                     "from_wallet_id": transfer_info["wallet_id"],
                     "to_wallet_id": to_wallet_id,
                     "instruction": instruction
                 })
     
-    # 获取最新区块哈希
-    recent_blockhash = await TransferService.get_recent_blockhash()
+    records = await run_db(TransferService.create_transfer_records, record_rows)
+    for item, record in zip(transfer_instructions, records):
+        item["transfer_id"] = record.id
+    
+    # 最新区块哈希在准备阶段已随余额一起取回
+    recent_blockhash = prepare_result["recent_blockhash"]
     
     return {
         "batch_id": batch_task.id,
@@ -694,45 +847,14 @@ async def api_execute_internal_transfer(
         "status": "ready_for_signature"
     }
 
-@app.post("/api/transfer/batch-confirm-multiple")
-async def api_confirm_multiple_transfer(
-    data: BatchTransferExecution,
-    user: str = Depends(current_user)
-):
-    """确认多接收地址批量转账已签名并广播"""
-    
-    successful_count = 0
-    failed_count = 0
-    
-    # 更新每个转账记录
-    for result in data.results:
-        transfer_id = result.get("transfer_id")
-        signature = result.get("signature")
-        error = result.get("error")
-        
-        if signature and not error:
-            TransferService.update_transfer_record(
-                record_id=transfer_id,
-                signature=signature,
-                status="pending"
-            )
-            successful_count += 1
-        else:
-            TransferService.update_transfer_record(
-                record_id=transfer_id,
-                status="failed",
-                error_message=error or "签名失败"
-            )
-            failed_count += 1
-    
-    # 更新批量转账任务状态
-    status = "completed" if failed_count == 0 else "partially_completed"
-    TransferService.update_batch_transfer_task(
-        task_id=data.batch_id,
-        successful_transfers=successful_count,
-        failed_transfers=failed_count,
-        status=status
-    )
+async def _confirm_batch(data: BatchTransferExecution, user: str) -> Dict[str, Any]:
+    """三种批量转账共用：签名结果写回记录并更新任务计数"""
+    try:
+        successful_count, failed_count, status = await run_db(
+            TransferService.confirm_batch_results, user, data.batch_id, data.results
+        )
+    except ValueError:
+        raise HTTPException(404, "批量转账任务不存在")
     
     return {
         "batch_id": data.batch_id,
@@ -741,52 +863,21 @@ async def api_confirm_multiple_transfer(
         "status": status
     }
 
+@app.post("/api/transfer/batch-confirm-multiple")
+async def api_confirm_multiple_transfer(
+    data: BatchTransferExecution,
+    user: str = Depends(current_user)
+):
+    """确认多接收地址批量转账已签名并广播"""
+    return await _confirm_batch(data, user)
+
 @app.post("/api/transfer/batch-confirm-internal")
 async def api_confirm_internal_transfer(
     data: BatchTransferExecution,
     user: str = Depends(current_user)
 ):
     """确认内部批量转账已签名并广播"""
-    
-    successful_count = 0
-    failed_count = 0
-    
-    # 更新每个转账记录
-    for result in data.results:
-        transfer_id = result.get("transfer_id")
-        signature = result.get("signature")
-        error = result.get("error")
-        
-        if signature and not error:
-            TransferService.update_transfer_record(
-                record_id=transfer_id,
-                signature=signature,
-                status="pending"
-            )
-            successful_count += 1
-        else:
-            TransferService.update_transfer_record(
-                record_id=transfer_id,
-                status="failed",
-                error_message=error or "签名失败"
-            )
-            failed_count += 1
-    
-    # 更新批量转账任务状态
-    status = "completed" if failed_count == 0 else "partially_completed"
-    TransferService.update_batch_transfer_task(
-        task_id=data.batch_id,
-        successful_transfers=successful_count,
-        failed_transfers=failed_count,
-        status=status
-    )
-    
-    return {
-        "batch_id": data.batch_id,
-        "successful_transfers": successful_count,
-        "failed_transfers": failed_count,
-        "status": status
-    }
+    return await _confirm_batch(data, user)
 
 @app.post("/api/transfer/confirm")
 async def api_confirm_transfer(
@@ -796,11 +887,13 @@ async def api_confirm_transfer(
     """确认转账已签名并广播"""
     
     # 更新转账记录
-    TransferService.update_transfer_record(
-        record_id=data.transfer_id,
-        signature=data.signature,
-        status="pending"
+    updated = await run_db(
+        TransferService.bulk_update_transfer_records,
+        user,
+        [{"id": data.transfer_id, "signature": data.signature, "status": "pending"}]
     )
+    if not updated:
+        raise HTTPException(404, "转账记录不存在")
     
     return {
         "status": "transaction_submitted",
@@ -816,10 +909,11 @@ async def api_execute_batch_transfer(
     """执行批量转账"""
     
     # 验证和准备批量转账
-    prepare_result = await api_prepare_batch_transfer(data, user)
+    prepare_result = await _prepare_batch_transfer(data, user, with_blockhash=True)
     
     # 创建批量转账任务
-    batch_task = TransferService.create_batch_transfer_task(
+    batch_task = await run_db(
+        TransferService.create_batch_transfer_task,
         owner=user,
         to_address=data.to_address,
         amount_per_wallet=data.amount_per_wallet,
@@ -829,14 +923,13 @@ async def api_execute_batch_transfer(
         memo=data.memo
     )
     
-    # 为每个有效钱包创建转账记录
-    transfer_records = []
+    # 为每个有效钱包创建转账记录（一次批量写入）
+    record_rows = []
     transfer_instructions = []
     
     for transfer_info in prepare_result["transfers"]:
         if transfer_info["sufficient"]:
-            # 创建转账记录
-            record = TransferService.create_transfer_record(
+            record_rows.append(dict(
                 owner=user,
                 from_address=transfer_info["from_address"],
                 to_address=data.to_address,
@@ -845,8 +938,7 @@ async def api_execute_batch_transfer(
                 memo=data.memo,
                 transfer_type="batch",
                 batch_id=batch_task.id
-            )
-            transfer_records.append(record)
+            ))
             
             # 构建转账指令
             instruction = TransferService.build_transfer_instruction(
@@ -855,13 +947,16 @@ async def api_execute_batch_transfer(
                 amount_lamports=int(data.amount_per_wallet * 1e9)
             )
             transfer_instructions.append({
-                "transfer_id": record.id,
                 "wallet_id": transfer_info["wallet_id"],
                 "instruction": instruction
             })
     
-    # 获取最新区块哈希
-    recent_blockhash = await TransferService.get_recent_blockhash()
+    records = await run_db(TransferService.create_transfer_records, record_rows)
+    for item, record in zip(transfer_instructions, records):
+        item["transfer_id"] = record.id
+    
+    # 最新区块哈希在准备阶段已随余额一起取回
+    recent_blockhash = prepare_result["recent_blockhash"]
     
     return {
         "batch_id": batch_task.id,
@@ -877,74 +972,52 @@ async def api_confirm_batch_transfer(
     user: str = Depends(current_user)
 ):
     """确认批量转账已签名并广播"""
-    
-    successful_count = 0
-    failed_count = 0
-    
-    # 更新每个转账记录
-    for result in data.results:
-        transfer_id = result.get("transfer_id")
-        signature = result.get("signature")
-        error = result.get("error")
-        
-        if signature and not error:
-            TransferService.update_transfer_record(
-                record_id=transfer_id,
-                signature=signature,
-                status="pending"
-            )
-            successful_count += 1
-        else:
-            TransferService.update_transfer_record(
-                record_id=transfer_id,
-                status="failed",
-                error_message=error or "签名失败"
-            )
-            failed_count += 1
-    
-    # 更新批量转账任务状态
-    status = "completed" if failed_count == 0 else "partially_completed"
-    TransferService.update_batch_transfer_task(
-        task_id=data.batch_id,
-        successful_transfers=successful_count,
-        failed_transfers=failed_count,
-        status=status
-    )
-    
-    return {
-        "batch_id": data.batch_id,
-        "successful_transfers": successful_count,
-        "failed_transfers": failed_count,
-        "status": status
-    }
+    return await _confirm_batch(data, user)
 
 @app.get("/api/transfer/records")
 def api_get_transfer_records(
     limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    address: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    summary: bool = False,
     user: str = Depends(current_user)
 ):
-    """获取用户转账记录"""
-    records = TransferService.get_user_transfer_records(user, limit)
+    """分页获取用户转账记录；address 匹配发送方或接收方，summary=true 时附带筛选结果的汇总"""
+    filters = dict(status=status, batch_id=batch_id, address=address, start=start, end=end)
+    try:
+        records, next_cursor = TransferService.list_transfer_records(user, limit, cursor, **filters)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
     
-    return [
-        {
-            "id": r.id,
-            "from_address": r.from_address,
-            "to_address": r.to_address,
-            "amount": r.amount,
-            "fee": r.fee,
-            "memo": r.memo,
-            "signature": r.signature,
-            "status": r.status,
-            "transfer_type": r.transfer_type,
-            "batch_id": r.batch_id,
-            "created": r.created.isoformat(timespec="seconds"),
-            "confirmed": r.confirmed.isoformat(timespec="seconds") if r.confirmed else None,
-            "error_message": r.error_message,
-            "block_height": r.block_height
-        }
-        for r in records
-    ]
+    result = {
+        "items": [
+            {
+                "id": r["id"],
+                "from_address": r["from_address"],
+                "to_address": r["to_address"],
+                "amount": r["amount"],
+                "fee": r["fee"],
+                "memo": r["memo"],
+                "signature": r["signature"],
+                "status": r["status"],
+                "transfer_type": r["transfer_type"],
+                "batch_id": r["batch_id"],
+                "created": r["created"].isoformat(timespec="seconds"),
+                "confirmed": r["confirmed"].isoformat(timespec="seconds") if r["confirmed"] else None,
+                "error_message": r["error_message"],
+                "block_height": r["block_height"]
+            }
+            for r in records
+        ],
+        "next_cursor": next_cursor
+    }
+    if summary:
+        result["summary"] = TransferService.summarize_transfer_records(user, **filters)
+    return result
 
 @app.get("/api/transfer/status/{signature}")
 async def api_check_transfer_status(
@@ -959,22 +1032,14 @@ async def api_check_transfer_status(
     # 如果交易已确认，更新数据库记录
     if chain_status["confirmed"]:
         # 查找对应的转账记录并更新
-        with get_session() as session:
-            from sqlmodel import select
-            records = session.exec(
-                select(TransferRecord)
-                .where(TransferRecord.signature == signature)
-                .where(TransferRecord.owner == user)
-            ).all()
-            
-            for record in records:
-                if record.status != "confirmed":
-                    TransferService.update_transfer_record(
-                        record_id=record.id,
-                        status="confirmed" if not chain_status["error"] else "failed",
-                        error_message=str(chain_status["error"]) if chain_status["error"] else None,
-                        block_height=chain_status["block_height"]
-                    )
+        await run_db(
+            TransferService.mark_signature_status,
+            owner=user,
+            signature=signature,
+            status="confirmed" if not chain_status["error"] else "failed",
+            error_message=str(chain_status["error"]) if chain_status["error"] else None,
+            block_height=chain_status["block_height"]
+        )
     
     return {
         "signature": signature,
@@ -988,42 +1053,54 @@ async def api_check_transfer_status(
 @app.get("/api/transfer/batch/{batch_id}")
 def api_get_batch_transfer_status(
     batch_id: str,
-    user: str = Depends(current_user)
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    user: str = Depends(current_user),
+    session: Session = Depends(get_db)
 ):
-    """获取批量转账状态"""
+    """获取批量转账状态：各状态计数由 SQL 分组统计，记录分页返回（可按 status 筛选）"""
     
-    with get_session() as session:
-        # 获取批量转账任务
-        task = session.get(BatchTransferTask, batch_id)
-        if not task or task.owner != user:
-            raise HTTPException(404, "批量转账任务不存在")
-        
-        # 获取相关的转账记录
-        records = session.exec(
-            select(TransferRecord)
-            .where(TransferRecord.batch_id == batch_id)
-            .where(TransferRecord.owner == user)
-        ).all()
-        
-        return {
-            "batch_id": batch_id,
-            "status": task.status,
-            "total_wallets": task.total_wallets,
-            "successful_transfers": task.successful_transfers,
-            "failed_transfers": task.failed_transfers,
-            "total_amount": task.total_amount,
-            "total_fees": task.total_fees,
-            "created": task.created.isoformat(timespec="seconds"),
-            "completed": task.completed.isoformat(timespec="seconds") if task.completed else None,
-            "records": [
-                {
-                    "id": r.id,
-                    "from_address": r.from_address,
-                    "amount": r.amount,
-                    "signature": r.signature,
-                    "status": r.status,
-                    "error_message": r.error_message
-                }
-                for r in records
-            ]
-        }
\ No newline at end of file
+    # 获取批量转账任务
+    task = session.get(BatchTransferTask, batch_id)
+    if not task or task.owner != user:
+        raise HTTPException(404, "批量转账任务不存在")
+    
+    # 各状态的笔数 / 金额（走 (batch_id, status) 索引）
+    summary = TransferService.summarize_transfer_records(user, batch_id=batch_id)
+    status_counts = {s: v["count"] for s, v in summary["by_status"].items()}
+    
+    # 获取相关的转账记录（分页）
+    try:
+        records, next_cursor = TransferService.list_transfer_records(
+            user, limit, cursor, batch_id=batch_id, status=status
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    
+    return {
+        "batch_id": batch_id,
+        "status": task.status,
+        "total_wallets": task.total_wallets,
+        "successful_transfers": task.successful_transfers,   # 与 batch-confirm 一致：已签名提交
+        "failed_transfers": task.failed_transfers,           # 签名失败
+        "confirmed_transfers": status_counts.get("confirmed", 0),   # 链上已确认
+        "total_amount": task.total_amount,
+        "total_fees": task.total_fees,
+        "created": task.created.isoformat(timespec="seconds"),
+        "completed": task.completed.isoformat(timespec="seconds") if task.completed else None,
+        "total_records": summary["count"],
+        "status_counts": status_counts,
+        "records": [
+            {
+                "id": r["id"],
+                "from_address": r["from_address"],
+                "amount": r["amount"],
+                "signature": r["signature"],
+                "status": r["status"],
+                "error_message": r["error_message"]
+            }
+            for r in records
+        ],
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,278 @@
+# migrations.py  —— 版本化数据库迁移
+# 用法（在 wallet_site 目录下）：
+#   python -m app.migrations upgrade    升级到最新版本
+#   python -m app.migrations current    打印当前版本
+# 每一步都是幂等的：旧库（没有 schema_version 表）从 0 开始依次执行，已经存在的表 / 列 / 索引会被跳过
+# 部署时先运行 upgrade 再启动应用；应用启动（main.lifespan）时核对版本，落后时报错退出
+import os
+import argparse
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import (inspect, text, MetaData, Table, Column, Index, ForeignKey,
+                        String, Integer, Float, DateTime, JSON)
+from sqlalchemy.engine import Engine
+
+from app.db import engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+# 设为 1 时导入发现版本落后直接就地升级（单进程开发环境用）；
+# 多个 worker 会同时执行同样的重建表操作，生产环境保持默认，由部署步骤先跑一次 upgrade
+AUTO_MIGRATE = os.getenv("WALLET_DB_AUTO_MIGRATE", "0").lower() in ("1", "true", "yes")
+
+
+class SchemaOutdatedError(RuntimeError):
+    pass
+
+
+# ---------- 版本 1 的表结构（冻结） ----------
+# 迁移步骤只引用这里的表定义，不引用 app.models：模型以后再改，已发布步骤的效果也不会跟着变
+# 模型有结构变化时追加新步骤（新列 / 新表写在新步骤里），不要修改这里
+V1 = MetaData()
+
+def _transfer_table(name: str, prefix: str, *extra_indexes: Index) -> Table:
+    """转账记录热表 / 归档表共用的列与索引"""
+    return Table(
+        name, V1,
+        Column("id", Integer, primary_key=True),
+        Column("owner", String, ForeignKey("user.wallet"), nullable=False, index=True),
+        Column("from_address", String, nullable=False, index=True),
+        Column("to_address", String, nullable=False, index=True),
+        Column("amount", Float, nullable=False),
+        Column("fee", Float, nullable=False),
+        Column("memo", String),
+        Column("signature", String, index=True),
+        Column("status", String, nullable=False, index=True),
+        Column("error_message", String),
+        Column("created", DateTime, nullable=False),
+        Column("confirmed", DateTime),
+        Column("block_height", Integer),
+        Column("transfer_type", String, nullable=False),
+        Column("batch_id", String),
+        Index(f"ix_{prefix}_owner_created_id", "owner", "created", "id"),
+        Index(f"ix_{prefix}_owner_status_created_id", "owner", "status", "created", "id"),
+        Index(f"ix_{prefix}_batch_created_id", "batch_id", "created", "id"),
+        Index(f"ix_{prefix}_batch_status", "batch_id", "status"),
+        *extra_indexes,
+    )
+
+V1_USER = Table(
+    "user", V1,
+    Column("wallet", String, primary_key=True, index=True),
+)
+V1_JOB = Table(
+    "job", V1,
+    Column("id", String, primary_key=True, index=True),
+    Column("owner", String, ForeignKey("user.wallet"), nullable=False),
+    Column("created", DateTime, nullable=False),
+    Column("params", JSON),
+    Column("path", String, nullable=False),
+    Column("count", Integer, nullable=False),
+    Column("status", String, nullable=False),
+    Column("generated", Integer, nullable=False),
+    Column("persisted", Integer, nullable=False),
+    Column("archived", Integer, nullable=False),
+    Column("error_message", String),
+    Column("updated", DateTime),
+)
+V1_WALLET_SEED = Table(
+    "walletseed", V1,
+    Column("id", String, primary_key=True),
+    Column("owner", String, ForeignKey("user.wallet"), nullable=False, index=True),
+    Column("seed", String, nullable=False),
+    Column("created", DateTime, nullable=False),
+)
+V1_WALLET = Table(
+    "wallet", V1,
+    Column("id", Integer, primary_key=True),
+    Column("public_key", String, nullable=False, index=True),
+    Column("owner", String, ForeignKey("user.wallet"), nullable=False, index=True),
+    Column("name", String),
+    Column("created", DateTime, nullable=False),
+    Column("balance", Float),
+    Column("last_checked", DateTime),
+    Column("source", String, nullable=False),
+    Index("ix_wallet_owner_created_id", "owner", "created", "id"),
+)
+V1_WALLET_KEY = Table(
+    "walletkey", V1,
+    Column("wallet_id", Integer, ForeignKey("wallet.id"), primary_key=True),
+    Column("secret_key", String),
+    Column("seed_id", String, ForeignKey("walletseed.id")),
+    Column("derivation_index", Integer),
+)
+V1_TRANSFER = _transfer_table("transferrecord", "transfer",
+                              Index("ix_transfer_status_created", "status", "created"))
+V1_TRANSFER_ARCHIVE = _transfer_table("transferrecordarchive", "transfer_archive")
+V1_BATCH_TASK = Table(
+    "batchtransfertask", V1,
+    Column("id", String, primary_key=True),
+    Column("owner", String, ForeignKey("user.wallet"), nullable=False, index=True),
+    Column("to_address", String, nullable=False),
+    Column("amount_per_wallet", Float, nullable=False),
+    Column("total_wallets", Integer, nullable=False),
+    Column("successful_transfers", Integer, nullable=False),
+    Column("failed_transfers", Integer, nullable=False),
+    Column("total_amount", Float, nullable=False),
+    Column("total_fees", Float, nullable=False),
+    Column("status", String, nullable=False),
+    Column("memo", String),
+    Column("created", DateTime, nullable=False),
+    Column("completed", DateTime),
+    Column("error_message", String),
+)
+
+
+# ---------- 工具 ----------
+def _add_columns(engine: Engine, table: Table, columns: Dict[str, Optional[str]]):
+    """给已有表补列：{列名: 默认值 SQL 或 None}；类型按表定义和当前方言生成"""
+    existing = {c["name"] for c in inspect(engine).get_columns(table.name)}
+    with engine.begin() as conn:
+        for name, default in columns.items():
+            if name in existing:
+                continue
+            ddl = table.c[name].type.compile(dialect=engine.dialect)
+            if default is not None:
+                ddl += f" NOT NULL DEFAULT {default}"
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {name} {ddl}"))
+
+
+def _create_indexes(engine: Engine, *tables: Table):
+    """create_all 只在建表时建索引，旧库补建表定义里新增的索引"""
+    for table in tables:
+        for idx in table.indexes:
+            idx.create(engine, checkfirst=True)
+
+
+def _rebuild_table(engine: Engine, table: Table):
+    """按表定义重建表并拷贝数据，用于删列 / 改约束
+    SQLite 不支持这些 ALTER，改名 → 建新表 → 拷贝 → 删旧表；其它数据库直接删掉定义里没有的列"""
+    insp = inspect(engine)
+    existing = [c["name"] for c in insp.get_columns(table.name)]
+    if engine.dialect.name != "sqlite":
+        with engine.begin() as conn:
+            for name in existing:
+                if name not in table.c:
+                    conn.execute(text(f"ALTER TABLE {table.name} DROP COLUMN {name}"))
+        return
+
+    col_list = ", ".join(c for c in existing if c in table.c)
+    with engine.begin() as conn:
+        for idx in insp.get_indexes(table.name):
+            conn.execute(text(f"DROP INDEX IF EXISTS {idx['name']}"))
+        # legacy_alter_table：改名时不要把其它表（如 walletkey）的外键也改成指向 _old 表
+        conn.execute(text("PRAGMA legacy_alter_table=ON"))
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+        conn.execute(text("PRAGMA legacy_alter_table=OFF"))
+        table.create(conn)
+        conn.execute(text(f"INSERT INTO {table.name} ({col_list}) "
+                          f"SELECT {col_list} FROM {table.name}_old"))
+        conn.execute(text(f"DROP TABLE {table.name}_old"))
+
+
+# ---------- 迁移步骤 ----------
+def _create_tables(engine: Engine):
+    """按冻结的版本 1 结构建立缺少的表（新库一步到位，旧库只补新表）"""
+    V1.create_all(engine)
+
+
+def _job_progress_columns(engine: Engine):
+    """生成任务的状态 / 进度列；旧任务都视为已完成"""
+    _add_columns(engine, V1_JOB, {
+        "status": "'completed'",
+        "generated": "0",
+        "persisted": "0",
+        "archived": "0",
+        "error_message": None,
+        "updated": None,
+    })
+
+
+def _split_wallet_keys(engine: Engine):
+    """私钥拆到 walletkey 表：先把 wallet 上的密钥列搬过去，再按新模型重建 wallet 表
+    搬运按 wallet_id 去重，中途中断后重跑可以接着做"""
+    legacy = {c["name"] for c in inspect(engine).get_columns("wallet")}
+    if "secret_key" not in legacy:
+        return
+    pick = lambda col: col if col in legacy else "NULL"
+    with engine.begin() as conn:
+        conn.execute(text(
+            "INSERT INTO walletkey (wallet_id, secret_key, seed_id, derivation_index) "
+            f"SELECT id, secret_key, {pick('seed_id')}, {pick('derivation_index')} FROM wallet "
+            "WHERE id NOT IN (SELECT wallet_id FROM walletkey)"))
+    _rebuild_table(engine, V1_WALLET)
+
+
+def _history_indexes(engine: Engine):
+    """钱包列表 / 转账历史的游标分页索引、批次状态索引、归档扫描索引"""
+    _create_indexes(engine, V1_WALLET, V1_TRANSFER, V1_TRANSFER_ARCHIVE)
+
+
+# (版本号, 说明, 步骤)；只能追加，不要修改已发布的步骤
+MIGRATIONS: List[Tuple[int, str, Callable[[Engine], None]]] = [
+    (1, "建表", _create_tables),
+    (2, "生成任务进度列", _job_progress_columns),
+    (3, "私钥拆分到 walletkey", _split_wallet_keys),
+    (4, "分页 / 批次 / 归档索引", _history_indexes),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+# ---------- 版本 ----------
+def current_version(engine: Engine = default_engine) -> int:
+    """当前库的结构版本；没有 schema_version 表时为 0"""
+    with engine.connect() as conn:
+        try:
+            return conn.execute(text("SELECT max(version) FROM schema_version")).scalar() or 0
+        except Exception:
+            return 0
+
+
+def _set_version(engine: Engine, version: int):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_version (version INTEGER NOT NULL)"))
+        conn.execute(text("DELETE FROM schema_version"))
+        conn.execute(text("INSERT INTO schema_version (version) VALUES (:v)"), {"v": version})
+
+
+def upgrade(engine: Engine = default_engine) -> List[int]:
+    """依次执行尚未应用的步骤，返回本次执行的版本号"""
+    applied = []
+    version = current_version(engine)
+    for step_version, desc, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        logger.info(f"数据库迁移 {step_version}: {desc}")
+        step(engine)
+        _set_version(engine, step_version)
+        applied.append(step_version)
+    return applied
+
+
+def ensure_schema(engine: Engine = default_engine):
+    """应用启动时调用：版本一致时只有一次查询；落后时报错（WALLET_DB_AUTO_MIGRATE=1 时就地升级）"""
+    version = current_version(engine)
+    if version >= LATEST_VERSION:
+        return
+    if not AUTO_MIGRATE:
+        raise SchemaOutdatedError(
+            f"数据库结构版本 {version} 落后于 {LATEST_VERSION}，请先运行 python -m app.migrations upgrade")
+    upgrade(engine)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="数据库迁移")
+    ap.add_argument("command", choices=("upgrade", "current"), nargs="?", default="upgrade")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "current":
+        print(f"{current_version()} / {LATEST_VERSION}")
+        return
+    applied = upgrade()
+    print(f"已升级到版本 {LATEST_VERSION}" + (f"（执行 {applied}）" if applied else "（无需迁移）"))
+
+
+if __name__ == "__main__":
+    main()
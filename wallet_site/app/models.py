@@ -1,4 +1,4 @@
-from sqlmodel import SQLModel, Field, Column, JSON
+from sqlmodel import SQLModel, Field, Column, JSON, Index
 from datetime import datetime
 from typing import Dict, Any, Optional
 
@@ -13,21 +13,43 @@ class Job(SQLModel, table=True):
                                    sa_column=Column(JSON))
     path: str
     count: int
+    status: str = "queued"          # 状态：queued/running/completed/failed
+    generated: int = 0              # 已生成
+    persisted: int = 0              # 已写入数据库
+    archived: int = 0               # 已打包
+    error_message: Optional[str] = None
+    updated: Optional[datetime] = None
+
+# HD 主种子：派生模式生成的钱包只记录 seed_id + 派生序号
+class WalletSeed(SQLModel, table=True):
+    id: str = Field(primary_key=True)
+    owner: str = Field(foreign_key="user.wallet", index=True)
+    seed: str  # 64 字节主种子（base58格式）
+    created: datetime = Field(default_factory=datetime.utcnow)
 
 # 钱包管理模型
 class Wallet(SQLModel, table=True):
+    # 列表按 (owner, created desc, id desc) 做游标分页
+    __table_args__ = (Index("ix_wallet_owner_created_id", "owner", "created", "id"),)
+
     id: int = Field(primary_key=True)
     public_key: str = Field(index=True)  # 钱包公钥
     owner: str = Field(foreign_key="user.wallet", index=True)  # 所属用户
     name: Optional[str] = None  # 钱包名称（可选）
-    secret_key: str  # 加密存储的私钥（base58格式）
     created: datetime = Field(default_factory=datetime.utcnow)
     balance: Optional[float] = None  # 缓存的余额（SOL）
     last_checked: Optional[datetime] = None  # 最后查询余额时间
     source: str = "generated"  # 来源：generated/imported
 
-# 转账记录模型
-class TransferRecord(SQLModel, table=True):
+# 钱包密钥：与 Wallet 一对一，单独成表，列表 / 余额等只读路径不会加载私钥
+class WalletKey(SQLModel, table=True):
+    wallet_id: int = Field(primary_key=True, foreign_key="wallet.id")
+    secret_key: Optional[str] = None  # 私钥（base58格式）；HD 钱包为空，按需派生
+    seed_id: Optional[str] = Field(default=None, foreign_key="walletseed.id")  # HD 主种子
+    derivation_index: Optional[int] = None  # 派生序号：m/44'/501'/i'/0'
+
+# 转账记录模型：热表 TransferRecord + 归档表 TransferRecordArchive 共用字段
+class TransferRecordBase(SQLModel):
     id: int = Field(primary_key=True)
     owner: str = Field(foreign_key="user.wallet", index=True)  # 发起转账的用户
     from_address: str = Field(index=True)  # 发送方地址
@@ -44,6 +66,24 @@ class TransferRecord(SQLModel, table=True):
     transfer_type: str = "single"  # 转账类型：single/batch
     batch_id: Optional[str] = None  # 批量转账ID（用于关联同一批次的转账）
 
+# 历史记录按 (created desc, id desc) 游标分页；状态 / 批次筛选各有一个带排序列的复合索引
+def _history_indexes(prefix: str) -> tuple:
+    return (
+        Index(f"ix_{prefix}_owner_created_id", "owner", "created", "id"),
+        Index(f"ix_{prefix}_owner_status_created_id", "owner", "status", "created", "id"),
+        Index(f"ix_{prefix}_batch_created_id", "batch_id", "created", "id"),
+        Index(f"ix_{prefix}_batch_status", "batch_id", "status"),   # 批次状态分组计数
+    )
+
+class TransferRecord(TransferRecordBase, table=True):
+    __table_args__ = _history_indexes("transfer") + (
+        Index("ix_transfer_status_created", "status", "created"),   # 归档扫描
+    )
+
+# 已确认 / 失败且超过保留期的记录由归档任务从热表搬到这里，id 保持不变
+class TransferRecordArchive(TransferRecordBase, table=True):
+    __table_args__ = _history_indexes("transfer_archive")
+
 # 批量转账任务模型
 class BatchTransferTask(SQLModel, table=True):
     id: str = Field(primary_key=True)  # 批量转账任务ID
@@ -0,0 +1,383 @@
+# rpc.py  —— 共享的 Solana JSON-RPC 客户端
+# 整个进程共用一个 httpx.AsyncClient（连接池 + keep-alive + HTTP/2），由 FastAPI startup / shutdown 创建和关闭
+# 应用外（脚本）直接调用时第一次请求会自动创建
+# 可以配置多个端点：每次请求发往当前最健康的端点，429 / 5xx / 网络错误时自动切换到其它端点
+import os
+import time
+import asyncio
+import logging
+import itertools
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# RPC 配置（环境变量）：
+#   SOLANA_RPC_URLS             多个端点，逗号分隔；每个端点可用 |N 指定每秒请求预算，例如
+#                               https://api.mainnet-beta.solana.com|4,https://rpc.example.com/?key=x|50
+#   SOLANA_RPC_URL              单个端点（未设置 SOLANA_RPC_URLS 时使用）
+#   SOLANA_RPC_RATE             未单独指定时每个端点的每秒请求预算，0 不限
+#   SOLANA_RPC_MAX_WAIT         所有端点都在退避 / 预算用尽时最多等待多久（秒），超过则直接失败
+#   SOLANA_RPC_TIMEOUT          单次请求总超时（秒）
+#   SOLANA_RPC_CONNECT_TIMEOUT  建立连接超时（秒）
+#   SOLANA_RPC_MAX_CONNECTIONS / SOLANA_RPC_KEEPALIVE   连接池上限 / 空闲保活连接数
+#   SOLANA_RPC_HTTP2            1 时启用 HTTP/2（需要 httpx[http2]，未安装时回退到 HTTP/1.1）
+#   SOLANA_RPC_CONCURRENCY      批量查询时同时在途的请求数上限（进程内共享）
+#   SOLANA_RPC_BATCH_SIZE       一个 JSON-RPC 批量数组里最多放多少个调用
+SOLANA_RPC_URL         = os.getenv("SOLANA_RPC_URL", "https://api.mainnet-beta.solana.com")
+SOLANA_RPC_URLS        = os.getenv("SOLANA_RPC_URLS", "")
+RPC_RATE               = float(os.getenv("SOLANA_RPC_RATE", "0"))
+RPC_MAX_WAIT           = float(os.getenv("SOLANA_RPC_MAX_WAIT", "5"))
+RPC_TIMEOUT            = float(os.getenv("SOLANA_RPC_TIMEOUT", "10"))
+RPC_CONNECT_TIMEOUT    = float(os.getenv("SOLANA_RPC_CONNECT_TIMEOUT", "5"))
+RPC_MAX_CONNECTIONS    = int(os.getenv("SOLANA_RPC_MAX_CONNECTIONS", "100"))
+RPC_KEEPALIVE          = int(os.getenv("SOLANA_RPC_KEEPALIVE", "20"))
+RPC_HTTP2              = os.getenv("SOLANA_RPC_HTTP2", "1").lower() in ("1", "true", "yes")
+RPC_CONCURRENCY        = int(os.getenv("SOLANA_RPC_CONCURRENCY", "8"))
+RPC_BATCH_SIZE         = int(os.getenv("SOLANA_RPC_BATCH_SIZE", "20"))
+
+ACCOUNTS_PER_CALL = 100     # getMultipleAccounts 单次最多 100 个地址
+
+LAMPORTS_PER_SOL = 1_000_000_000
+
+
+class RpcError(Exception):
+    """RPC 返回了 error 字段"""
+    def __init__(self, code: Optional[int], message: str):
+        super().__init__(f"RPC 错误 {code}: {message}")
+        self.code = code
+        self.message = message
+
+    @classmethod
+    def from_response(cls, err: Any) -> "RpcError":
+        if isinstance(err, dict):
+            return cls(err.get("code"), err.get("message", str(err)))
+        return cls(None, str(err))
+
+
+# ---------- 端点健康度 ----------
+EWMA_ALPHA       = 0.2      # 延迟 / 错误率的滑动平均系数
+ERROR_HALF_LIFE  = 30.0     # 错误率随时间衰减的半衰期（秒），出过错的端点过一段时间会重新被尝试
+BACKOFF_DEFAULT  = 1.0      # 429 没有 Retry-After 时的初始退避（秒），连续 429 翻倍
+BACKOFF_MAX      = 60.0
+
+
+class Endpoint:
+    """一个 RPC 端点：令牌桶预算 + 延迟 / 错误率 EWMA + 429 冷却"""
+
+    def __init__(self, url: str, rate: float = RPC_RATE):
+        self.url = url
+        self.rate = rate                      # 每秒请求预算，0 不限
+        self.burst = max(rate, 1.0)
+        self.tokens = self.burst
+        self.refilled = time.monotonic()
+        self.latency: Optional[float] = None  # 秒，EWMA
+        self.error_rate = 0.0                 # 0~1，EWMA
+        self.failed_at = 0.0
+        self.cooldown_until = 0.0
+        self.backoff = BACKOFF_DEFAULT
+        self.requests = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def _refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def ready_in(self, now: float) -> float:
+        """还要等多少秒才能发下一个请求（冷却 + 预算）"""
+        wait = max(0.0, self.cooldown_until - now)
+        if self.rate > 0:
+            self._refill(now)
+            if self.tokens < 1:
+                wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def take(self, now: float):
+        if self.rate > 0:
+            self._refill(now)
+            self.tokens -= 1
+        self.requests += 1
+
+    def score(self, now: float) -> float:
+        """越小越健康：延迟按错误率放大；没测过延迟的端点优先试一次"""
+        errors = self.error_rate * 0.5 ** ((now - self.failed_at) / ERROR_HALF_LIFE)
+        return (self.latency or 0.0) * (1 + 4 * errors) + errors
+
+    def succeeded(self, latency: float):
+        self.latency = latency if self.latency is None else \
+            (1 - EWMA_ALPHA) * self.latency + EWMA_ALPHA * latency
+        self.error_rate *= 1 - EWMA_ALPHA
+        self.backoff = BACKOFF_DEFAULT
+
+    def failed(self, now: float):
+        self.error_rate = (1 - EWMA_ALPHA) * self.error_rate + EWMA_ALPHA
+        self.failed_at = now
+        self.errors += 1
+
+    def throttled(self, now: float, retry_after: Optional[float]):
+        """收到 429：按 Retry-After 冷却，没有则指数退避"""
+        delay = retry_after if retry_after is not None else self.backoff
+        self.backoff = min(self.backoff * 2, BACKOFF_MAX)
+        self.cooldown_until = max(self.cooldown_until, now + min(delay, BACKOFF_MAX))
+        self.rate_limited += 1
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {"url": self.url, "requests": self.requests, "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "cooldown_s": round(max(0.0, self.cooldown_until - now), 1)}
+
+
+def _parse_endpoints(spec: str) -> List[Endpoint]:
+    """url|rate,url|rate,..."""
+    endpoints = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, rate = item.partition("|")
+        endpoints.append(Endpoint(url.strip(), float(rate) if rate else RPC_RATE))
+    return endpoints
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Retry-After：秒数或 HTTP 日期"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class SolanaRpc:
+    """Solana JSON-RPC 客户端；方法失败时抛 httpx.HTTPError / RpcError，由调用方决定兜底"""
+
+    def __init__(self, urls: Optional[Sequence[str]] = None, timeout: float = RPC_TIMEOUT,
+                 connect_timeout: float = RPC_CONNECT_TIMEOUT, http2: bool = RPC_HTTP2,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        """urls: ["url" 或 "url|每秒预算", ...]，默认取 SOLANA_RPC_URLS / SOLANA_RPC_URL
+        transport: 测试时传入 httpx.MockTransport 等桩实现"""
+        spec = ",".join(urls) if urls else (SOLANA_RPC_URLS or SOLANA_RPC_URL)
+        self.endpoints = _parse_endpoints(spec)
+        if not self.endpoints:
+            raise ValueError("没有配置 Solana RPC 端点")
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.http2 = http2 and _http2_available()
+        if http2 and not self.http2:
+            logger.warning("未安装 h2，Solana RPC 使用 HTTP/1.1")
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._ids = itertools.count(1)
+
+    # ---------- 生命周期 ----------
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                http2=self.http2,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=RPC_MAX_CONNECTIONS,
+                                    max_keepalive_connections=RPC_KEEPALIVE),
+                transport=self._transport,
+            )
+            # 和 client 一起创建，绑定当前事件循环
+            self._slots = asyncio.Semaphore(RPC_CONCURRENCY)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._slots = None
+
+    # ---------- 端点选择 ----------
+    async def _acquire(self, tried: set) -> Optional[Endpoint]:
+        """选出可立即发送的端点中最健康的一个并占用一个预算，本次请求还没试过的端点优先；
+        都在冷却 / 预算用尽时等最早可用的那个，总共需要等待超过 RPC_MAX_WAIT 时返回 None
+        醒来后重新检查：并发的等待者会同时醒来，只有抢到预算的才能发送，其余继续等"""
+        deadline = time.monotonic() + RPC_MAX_WAIT
+        while True:
+            now = time.monotonic()
+            ready = [ep for ep in self.endpoints if ep.ready_in(now) == 0]
+            fresh = [ep for ep in ready if ep not in tried]
+            if fresh or ready:
+                endpoint = min(fresh or ready, key=lambda ep: ep.score(now))
+                endpoint.take(now)
+                return endpoint
+            wait = min(ep.ready_in(now) for ep in self.endpoints)
+            if now + wait > deadline:
+                return None
+            await asyncio.sleep(wait)
+
+    def endpoint_stats(self) -> List[Dict[str, Any]]:
+        return [ep.stats() for ep in self.endpoints]
+
+    # ---------- 调用 ----------
+    async def _post(self, payload: Any) -> Any:
+        """发往最健康的端点；网络错误、超时、429、5xx 时换端点重试（每个端点最多一次，
+        全部试过后再等退避结束重试一轮）。其它 4xx 直接抛出"""
+        if self._client is None:
+            await self.start()
+        tried: set = set()
+        last_error: Optional[Exception] = None
+        for _ in range(2 * len(self.endpoints)):
+            endpoint = await self._acquire(tried)
+            if endpoint is None:
+                break
+            tried.add(endpoint)
+            started = time.monotonic()
+            try:
+                response = await self._client.post(endpoint.url, json=payload)
+            except httpx.TransportError as e:
+                endpoint.failed(time.monotonic())
+                logger.warning(f"RPC 端点 {endpoint.url} 请求失败，切换端点: {e!r}")
+                last_error = e
+                continue
+            now = time.monotonic()
+            if response.status_code == 429:
+                endpoint.throttled(now, _retry_after(response))
+                logger.warning(f"RPC 端点 {endpoint.url} 限流（429），冷却 {endpoint.cooldown_until - now:.1f}s")
+                last_error = httpx.HTTPStatusError("429 Too Many Requests",
+                                                   request=response.request, response=response)
+                continue
+            if response.status_code >= 500:
+                endpoint.failed(now)
+                logger.warning(f"RPC 端点 {endpoint.url} 返回 {response.status_code}，切换端点")
+                last_error = httpx.HTTPStatusError(f"{response.status_code} from {endpoint.url}",
+                                                   request=response.request, response=response)
+                continue
+            response.raise_for_status()
+            endpoint.succeeded(now - started)
+            return response.json()
+        raise last_error or RpcError(None, "所有 RPC 端点都在限流冷却中")
+
+    def _request(self, method: str, params: Optional[list]) -> Dict[str, Any]:
+        payload = {"jsonrpc": "2.0", "id": next(self._ids), "method": method}
+        if params is not None:
+            payload["params"] = params
+        return payload
+
+    async def call(self, method: str, params: Optional[list] = None) -> Any:
+        """发送一个请求，返回 result"""
+        data = await self._post(self._request(method, params))
+        if "error" in data:
+            raise RpcError.from_response(data["error"])
+        return data["result"]
+
+    async def batch(self, calls: Sequence[Tuple[str, Optional[list]]]) -> List[Any]:
+        """多个（可以是不同方法的）调用按 JSON-RPC 批量数组发送，响应按 id 对应回去
+        每 RPC_BATCH_SIZE 个调用一个 HTTP 请求，多个请求并发，同时在途的不超过 RPC_CONCURRENCY
+        返回与 calls 一一对应：成功为 result，失败为异常实例（不抛出，单条出错不影响其它条目）"""
+        if self._client is None:
+            await self.start()
+        results: List[Any] = [None] * len(calls)
+
+        async def send(offset: int, group: Sequence[Tuple[str, Optional[list]]]):
+            payload = [self._request(method, params) for method, params in group]
+            pending = {req["id"]: offset + i for i, req in enumerate(payload)}
+            async with self._slots:
+                try:
+                    data = await self._post(payload)
+                except Exception as e:
+                    logger.error(f"RPC 批量请求失败（{len(payload)} 条）: {e}")
+                    data = e
+            if isinstance(data, Exception) or not isinstance(data, list):
+                # 整个请求失败，或节点对整批只返回一个 error 对象
+                err = data if isinstance(data, Exception) else RpcError.from_response(data.get("error"))
+                for idx in pending.values():
+                    results[idx] = err
+                return
+            for item in data:
+                idx = pending.pop(item.get("id"), None)
+                if idx is None:
+                    continue
+                results[idx] = RpcError.from_response(item["error"]) if "error" in item else item.get("result")
+            for idx in pending.values():
+                results[idx] = RpcError(None, "批量响应中缺少该请求")
+
+        await asyncio.gather(*(send(i, calls[i:i + RPC_BATCH_SIZE])
+                               for i in range(0, len(calls), RPC_BATCH_SIZE)))
+        return results
+
+    async def get_balance(self, address: str) -> int:
+        """余额（lamports）"""
+        result = await self.call("getBalance", [address])
+        return result["value"]
+
+    async def get_latest_blockhash(self) -> str:
+        result = await self.call("getLatestBlockhash")
+        return result["value"]["blockhash"]
+
+    async def get_signature_statuses(self, signatures: List[str],
+                                     search_history: bool = True) -> List[Optional[Dict[str, Any]]]:
+        """与 signatures 一一对应；未找到的签名为 None"""
+        result = await self.call("getSignatureStatuses",
+                                 [signatures, {"searchTransactionHistory": search_history}])
+        return result["value"]
+
+    async def get_multiple_accounts(self, addresses: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """与 addresses 一一对应；不存在的账户为 None"""
+        result = await self.call("getMultipleAccounts", _accounts_params(addresses))
+        return result["value"]
+
+    async def get_balances(self, addresses: List[str]) -> Dict[str, Optional[int]]:
+        """批量余额（lamports）：每 ACCOUNTS_PER_CALL 个地址一个 getMultipleAccounts，全部放进批量请求
+        不存在的账户余额为 0；所在分块请求失败的地址为 None"""
+        _, balances = await self.get_blockhash_and_balances(addresses, with_blockhash=False)
+        return balances
+
+    async def get_blockhash_and_balances(
+        self, addresses: List[str], with_blockhash: bool = True,
+    ) -> Tuple[Optional[str], Dict[str, Optional[int]]]:
+        """转账准备用：最新区块哈希和一批余额在同一个批量请求里查询 ➜ (blockhash | None, balances)"""
+        unique = list(dict.fromkeys(addresses))
+        chunks = [unique[i:i + ACCOUNTS_PER_CALL] for i in range(0, len(unique), ACCOUNTS_PER_CALL)]
+        calls = [("getMultipleAccounts", _accounts_params(chunk)) for chunk in chunks]
+        if with_blockhash:
+            calls.insert(0, ("getLatestBlockhash", None))
+        results = await self.batch(calls)
+
+        blockhash = None
+        if with_blockhash:
+            head = results.pop(0)
+            if isinstance(head, Exception):
+                logger.error(f"获取区块哈希失败: {head}")
+            else:
+                blockhash = head["value"]["blockhash"]
+
+        balances: Dict[str, Optional[int]] = {}
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                logger.error(f"批量查询余额失败（{len(chunk)} 个地址）: {result}")
+                balances.update(dict.fromkeys(chunk))
+                continue
+            for address, account in zip(chunk, result["value"]):
+                balances[address] = account["lamports"] if account else 0
+        return blockhash, balances
+
+
+def _accounts_params(addresses: List[str]) -> list:
+    # 只取 lamports 等元信息，dataSlice 长度 0 不下载账户数据
+    return [addresses, {"encoding": "base64", "dataSlice": {"offset": 0, "length": 0}}]
+
+
+# 进程内共享实例
+rpc = SolanaRpc()
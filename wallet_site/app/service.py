@@ -1,23 +1,77 @@
 from pathlib import Path
-from typing import List, Dict, Any
+from datetime import datetime
+from typing import List
+from sqlalchemy import update, func, or_, and_
 from sqlmodel import select
 from app.db import engine, get_session
-from app.models import Job, User, Wallet, TransferRecord, BatchTransferTask
+from app.cache import job_cache
+from app.models import Job
 
-# 第一次启动建表
-Job.metadata.create_all(engine)
-User.metadata.create_all(engine)
-Wallet.metadata.create_all(engine)
-TransferRecord.metadata.create_all(engine)
-BatchTransferTask.metadata.create_all(engine)
+# 表结构由 app/migrations.py 维护（python -m app.migrations upgrade），应用启动时核对版本
 
 # add_job 里增加 owner
-def add_job(job_id, path, count, params, owner):
+def add_job(job_id, path, count, params, owner, status="completed"):
     with get_session() as ses:
-        ses.add(Job(id=job_id, owner=owner,
+        ses.add(Job(id=job_id, owner=owner, status=status,
                     path=str(path), count=count, params=params))
         ses.commit()
+    job_cache.invalidate(owner)
 
+def update_job(job_id: str, **fields) -> Job | None:
+    """更新任务状态 / 进度计数"""
+    with get_session() as ses:
+        job = ses.get(Job, job_id)
+        if job:
+            for k, v in fields.items():
+                setattr(job, k, v)
+            job.updated = datetime.utcnow()
+            ses.add(job)
+            ses.commit()
+            ses.refresh(job)
+            job_cache.invalidate(job.owner)
+        return job
+
+# ---------- 断点续跑 ----------
+RESUMABLE_STATES = ("queued", "running")
+
+def claim_job(job_id: str, stale_before: datetime) -> bool:
+    """原子地认领任务：排队中的，或租约（updated）已过期的运行中任务"""
+    with engine.begin() as conn:
+        res = conn.execute(
+            update(Job.__table__)
+            .where(Job.id == job_id)
+            .where(or_(Job.status == "queued",
+                       and_(Job.status == "running",
+                            func.coalesce(Job.updated, Job.created) < stale_before)))
+            .values(status="running", updated=datetime.utcnow())
+            .returning(Job.owner)
+        )
+        owner = res.scalar()
+    if owner is None:
+        return False
+    job_cache.invalidate(owner)
+    return True
+
+def touch_job(job_id: str):
+    """续租：刷新 updated（任务列表不展示，不必让缓存失效）"""
+    with engine.begin() as conn:
+        conn.execute(update(Job.__table__).where(Job.id == job_id)
+                     .values(updated=datetime.utcnow()))
+
+def mark_persisted(session, job_id: str, persisted: int):
+    """在调用方的事务里写入入库检查点，与钱包行一起提交"""
+    session.execute(update(Job.__table__).where(Job.id == job_id)
+                    .values(persisted=persisted, updated=datetime.utcnow()))
+
+def list_resumable_jobs(stale_before: datetime) -> List[Job]:
+    """租约已过期、需要续跑的任务"""
+    with get_session() as ses:
+        return ses.exec(select(Job)
+                        .where(Job.status.in_(RESUMABLE_STATES))
+                        .where(func.coalesce(Job.updated, Job.created) < stale_before)
+                        .order_by(Job.created)).all()
+
+@job_cache.cached
 def list_jobs_by_user(owner: str):
     with get_session() as ses:
         return ses.exec(select(Job).where(Job.owner == owner)
@@ -26,4 +80,4 @@ def list_jobs_by_user(owner: str):
 
 def get_job(jid: str) -> Job | None:
     with get_session() as ses:
-        return ses.get(Job, jid)
\ No newline at end of file
+        return ses.get(Job, jid)
@@ -1,19 +1,68 @@
+import os
 import json
 import base58
+import asyncio
 import logging
 import uuid
-from datetime import datetime
-from typing import List, Dict, Any, Optional
-import httpx
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from sqlalchemy import func, or_, tuple_, update, insert, delete, bindparam
 from sqlmodel import select
 
-from app.db import get_session
-from app.models import Wallet, TransferRecord, BatchTransferTask
+from app.db import get_session, run_db
+from app.cache import wallet_cache
+from app.rpc import rpc, LAMPORTS_PER_SOL
+from app.models import Wallet, TransferRecord, TransferRecordArchive, BatchTransferTask
+from app.wallet_service import encode_cursor, decode_cursor, split_fresh_balances, store_balances
 
 logger = logging.getLogger(__name__)
 
-# Solana RPC 端点
-SOLANA_RPC_URL = "https://api.mainnet-beta.solana.com"
+RECORD_PAGE_SIZE = 50
+RECORD_PAGE_MAX  = 500
+
+# 归档：已确认 / 失败且超过 TRANSFER_ARCHIVE_DAYS 天的记录每隔 TRANSFER_ARCHIVE_INTERVAL 秒搬到归档表
+# TRANSFER_ARCHIVE_DAYS <= 0 关闭归档
+TRANSFER_ARCHIVE_DAYS     = float(os.getenv("TRANSFER_ARCHIVE_DAYS", "30"))
+TRANSFER_ARCHIVE_INTERVAL = int(os.getenv("TRANSFER_ARCHIVE_INTERVAL", "3600"))
+ARCHIVE_CHUNK  = 5000                      # 每个事务搬运的行数
+ARCHIVE_STATES = ("confirmed", "failed")   # 只归档终态记录
+
+# 历史查询同时读热表和归档表
+HISTORY_MODELS = (TransferRecord, TransferRecordArchive)
+
+# 历史列表返回的列
+RECORD_LIST_FIELDS = (
+    "id", "from_address", "to_address", "amount", "fee", "memo", "signature", "status",
+    "transfer_type", "batch_id", "created", "confirmed", "error_message", "block_height",
+)
+
+def _naive_utc(dt: datetime) -> datetime:
+    """数据库里存的是不带时区的 UTC 时间"""
+    return dt.astimezone(timezone.utc).replace(tzinfo=None) if dt.tzinfo else dt
+
+def _record_filters(
+    model,
+    owner: str,
+    status: Optional[str] = None,
+    batch_id: Optional[str] = None,
+    address: Optional[str] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> list:
+    """转账记录筛选条件（model 为热表或归档表）；address 匹配发送方或接收方，时间区间为 [start, end)"""
+    conds = [model.owner == owner]
+    if status:
+        conds.append(model.status == status)
+    if batch_id:
+        conds.append(model.batch_id == batch_id)
+    if address:
+        conds.append(or_(model.from_address == address,
+                         model.to_address == address))
+    if start:
+        conds.append(model.created >= _naive_utc(start))
+    if end:
+        conds.append(model.created < _naive_utc(end))
+    return conds
 
 class TransferService:
     """Solana转账服务"""
@@ -29,55 +78,43 @@ class TransferService:
             return False
     
     @staticmethod
-    async def get_balance(address: str) -> Optional[float]:
-        """获取地址余额"""
+    async def get_balance(address: str, owner: Optional[str] = None,
+                          max_staleness: Optional[float] = None) -> Optional[float]:
+        """获取地址余额；给出 owner 且地址是该用户的钱包时先查余额缓存，刷新后写回"""
+        if owner:
+            wallet = await run_db(TransferService.get_user_wallet_by_address, owner, address)
+            if wallet:
+                _, _, balances = await TransferService.estimate_fee_and_balances([wallet], owner, max_staleness)
+                return balances[address]
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    SOLANA_RPC_URL,
-                    json={
-                        "jsonrpc": "2.0",
-                        "id": 1,
-                        "method": "getBalance",
-                        "params": [address]
-                    },
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "result" in data:
-                        balance_lamports = data["result"]["value"]
-                        return balance_lamports / 1e9  # 转换为SOL
-                        
+            return await rpc.get_balance(address) / LAMPORTS_PER_SOL  # 转换为SOL
         except Exception as e:
             logger.error(f"获取余额失败 {address}: {e}")
             
         return None
     
+    @staticmethod
+    async def estimate_fee_and_balances(
+        wallets: List[Wallet], owner: str, max_staleness: Optional[float] = None,
+        with_blockhash: bool = False,
+    ) -> Tuple[float, Optional[str], Dict[str, Optional[float]]]:
+        """转账准备 ➜ (fee, blockhash | None, balances)
+        余额先用缓存（Wallet.balance / last_checked），过期的余额与最新区块哈希（with_blockhash 时）
+        合并成一个 JSON-RPC 批量请求，刷新的余额写回；都不需要时不发 RPC"""
+        balances, stale = split_fresh_balances(wallets, max_staleness)
+        blockhash = None
+        if stale or with_blockhash:
+            blockhash, lamports = await rpc.get_blockhash_and_balances(
+                [w.public_key for w in stale], with_blockhash=with_blockhash)
+            balances.update(await store_balances(stale, lamports, owner))
+        # Solana转账手续费通常是5000 lamports
+        return 5000 / LAMPORTS_PER_SOL, blockhash, balances
+    
     @staticmethod
     async def estimate_fee() -> float:
-        """估算转账手续费"""
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    SOLANA_RPC_URL,
-                    json={
-                        "jsonrpc": "2.0",
-                        "id": 1,
-                        "method": "getRecentBlockhash"
-                    },
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    # Solana转账手续费通常是5000 lamports
-                    return 5000 / 1e9  # 0.000005 SOL
-                    
-        except Exception as e:
-            logger.error(f"估算手续费失败: {e}")
-            
-        return 0.000005  # 默认手续费
+        """估算转账手续费：固定费率，不需要查 RPC"""
+        # Solana转账手续费通常是5000 lamports
+        return 5000 / LAMPORTS_PER_SOL  # 0.000005 SOL
     
     @staticmethod
     def get_user_wallet_by_address(owner: str, public_key: str) -> Optional[Wallet]:
@@ -90,6 +127,7 @@ class TransferService:
             ).first()
     
     @staticmethod
+    @wallet_cache.cached
     def get_user_wallets_by_ids(owner: str, wallet_ids: List[int]) -> List[Wallet]:
         """根据ID获取用户钱包"""
         with get_session() as session:
@@ -127,6 +165,16 @@ class TransferService:
             session.refresh(record)
             return record
     
+    @staticmethod
+    def create_transfer_records(rows: List[Dict[str, Any]]) -> List[TransferRecord]:
+        """批量创建转账记录：一个事务写入，返回顺序与 rows 一致"""
+        with get_session() as session:
+            session.expire_on_commit = False
+            records = [TransferRecord(**row) for row in rows]
+            session.add_all(records)
+            session.commit()
+            return records
+    
     @staticmethod
     def update_transfer_record(
         record_id: int,
@@ -154,17 +202,213 @@ class TransferService:
                 session.commit()
     
     @staticmethod
-    def get_user_transfer_records(owner: str, limit: int = 50) -> List[TransferRecord]:
-        """获取用户转账记录"""
+    def bulk_update_transfer_records(owner: str, updates: List[Dict[str, Any]], session=None,
+                                     batch_id: Optional[str] = None) -> int:
+        """批量更新转账记录：一条 UPDATE executemany，一个事务
+        updates: [{"id", "signature"?, "status"?, "error_message"?, "block_height"?}]，
+        缺省 / 为空的字段保持原值（coalesce）；只更新属于 owner（给出 batch_id 时还须属于该批次）的记录，
+        返回实际更新条数；传入 session 时在调用方的事务里执行、由调用方提交"""
+        if not updates:
+            return 0
+        table = TransferRecord.__table__
+        stmt = (
+            update(table)
+            .where(table.c.id == bindparam("b_id"))
+            .where(table.c.owner == bindparam("b_owner"))
+            .values(
+                signature=func.coalesce(bindparam("b_signature"), table.c.signature),
+                status=func.coalesce(bindparam("b_status"), table.c.status),
+                error_message=func.coalesce(bindparam("b_error"), table.c.error_message),
+                block_height=func.coalesce(bindparam("b_height"), table.c.block_height),
+                confirmed=func.coalesce(bindparam("b_confirmed"), table.c.confirmed),
+            )
+        )
+        if batch_id is not None:
+            stmt = stmt.where(table.c.batch_id == batch_id)
+        now = datetime.utcnow()
+        params = [{
+            "b_id": u["id"],
+            "b_owner": owner,
+            "b_signature": u.get("signature") or None,
+            "b_status": u.get("status") or None,
+            "b_error": u.get("error_message") or None,
+            "b_height": u.get("block_height") or None,
+            "b_confirmed": now if u.get("status") == "confirmed" else None,
+        } for u in updates]
+        
+        if session is not None:
+            return session.execute(stmt, params).rowcount
+        with get_session() as session:
+            count = session.execute(stmt, params).rowcount
+            session.commit()
+            return count
+    
+    @staticmethod
+    def confirm_batch_results(owner: str, batch_id: str, results: List[Dict[str, Any]]) -> Tuple[int, int, str]:
+        """批量确认：前端回传的签名结果一次性写入转账记录，并更新批量任务计数，同一事务
+        results: [{"transfer_id", "signature"?, "error"?}] ➜ (成功提交数, 签名失败数, 任务状态)
+        计数只算实际更新到的（属于 owner 且属于该批次的）记录；有已提交的交易时任务为 processing，
+        等链上全部确认 / 失败后由 mark_signature_status 结束；批次不存在或不属于 owner 时 ValueError"""
+        submitted, failed = [], []
+        for result in results:
+            signature, error = result.get("signature"), result.get("error")
+            if signature and not error:
+                submitted.append({"id": result.get("transfer_id"), "signature": signature, "status": "pending"})
+            else:
+                failed.append({"id": result.get("transfer_id"), "status": "failed",
+                               "error_message": error or "签名失败"})
+        
+        with get_session() as session:
+            task = session.get(BatchTransferTask, batch_id)
+            if not task or task.owner != owner:
+                raise ValueError("批量转账任务不存在")
+            successful_count = TransferService.bulk_update_transfer_records(
+                owner, submitted, session=session, batch_id=batch_id)
+            failed_count = TransferService.bulk_update_transfer_records(
+                owner, failed, session=session, batch_id=batch_id)
+            if successful_count:
+                status = "processing"
+            else:
+                status = "completed" if failed_count == 0 else "partially_completed"
+            task.successful_transfers = successful_count
+            task.failed_transfers = failed_count
+            task.status = status
+            if status != "processing":
+                task.completed = datetime.utcnow()
+            session.add(task)
+            session.commit()
+        return successful_count, failed_count, status
+    
+    @staticmethod
+    def mark_signature_status(
+        owner: str,
+        signature: str,
+        status: str,
+        error_message: Optional[str] = None,
+        block_height: Optional[int] = None
+    ) -> int:
+        """链上确认后更新该签名对应的未确认记录，返回更新条数
+        所属批次的记录全部确认 / 失败后，批量任务随之结束"""
         with get_session() as session:
-            # 修复SQLAlchemy错误：使用正确的查询语法
             records = session.exec(
                 select(TransferRecord)
+                .where(TransferRecord.signature == signature)
                 .where(TransferRecord.owner == owner)
-                .order_by(TransferRecord.created.desc())
-                .limit(limit)
+                .where(TransferRecord.status != "confirmed")
             ).all()
-            return list(records)
+            for record in records:
+                record.status = status
+                if status == "confirmed":
+                    record.confirmed = datetime.utcnow()
+                if error_message:
+                    record.error_message = error_message
+                if block_height:
+                    record.block_height = block_height
+                session.add(record)
+            session.flush()
+            for batch_id in {r.batch_id for r in records if r.batch_id}:
+                TransferService._settle_batch(session, owner, batch_id)
+            session.commit()
+            return len(records)
+    
+    @staticmethod
+    def _settle_batch(session, owner: str, batch_id: str):
+        """批次里已没有待确认的记录时结束任务：有失败记录为 partially_completed，否则 completed
+        终态记录才会被归档，待确认的一定还在热表"""
+        task = session.get(BatchTransferTask, batch_id)
+        if not task or task.owner != owner or task.status != "processing":
+            return
+        counts = dict(session.exec(
+            select(TransferRecord.status, func.count())
+            .where(TransferRecord.batch_id == batch_id)
+            .group_by(TransferRecord.status)
+        ).all())
+        if any(status not in ARCHIVE_STATES for status in counts):
+            return
+        task.status = "completed" if not counts.get("failed") else "partially_completed"
+        task.completed = datetime.utcnow()
+        session.add(task)
+    
+    @staticmethod
+    def list_transfer_records(
+        owner: str,
+        limit: int = RECORD_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        **filters
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """按创建时间倒序返回一页转账记录 ➜ (rows, next_cursor)；filters 见 _record_filters
+        热表和归档表各按游标取 limit+1 行再归并，两边都是一次索引查找"""
+        limit = max(1, min(limit, RECORD_PAGE_MAX))
+        after = decode_cursor(cursor) if cursor else None
+        
+        rows = []
+        with get_session() as session:
+            for model in HISTORY_MODELS:
+                stmt = (select(*(getattr(model, f) for f in RECORD_LIST_FIELDS))
+                        .where(*_record_filters(model, owner, **filters)))
+                if after:
+                    stmt = stmt.where(tuple_(model.created, model.id) < after)
+                stmt = stmt.order_by(model.created.desc(), model.id.desc()).limit(limit + 1)
+                rows.extend(session.exec(stmt).all())
+        rows.sort(key=lambda r: (r.created, r.id), reverse=True)
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created, rows[-1].id)
+        return [dict(r._mapping) for r in rows], next_cursor
+    
+    @staticmethod
+    def summarize_transfer_records(owner: str, **filters) -> Dict[str, Any]:
+        """筛选结果的汇总：总笔数 / 金额 / 手续费，以及按状态的分项（热表、归档表各一次 GROUP BY）"""
+        by_status: Dict[str, Dict[str, Any]] = {}
+        with get_session() as session:
+            for model in HISTORY_MODELS:
+                stmt = (
+                    select(model.status,
+                           func.count(),
+                           func.coalesce(func.sum(model.amount), 0.0),
+                           func.coalesce(func.sum(model.fee), 0.0))
+                    .where(*_record_filters(model, owner, **filters))
+                    .group_by(model.status)
+                )
+                for status, count, amount, fees in session.exec(stmt).all():
+                    agg = by_status.setdefault(status, {"count": 0, "amount": 0.0, "fees": 0.0})
+                    agg["count"] += count
+                    agg["amount"] += amount
+                    agg["fees"] += fees
+        return {
+            "count": sum(v["count"] for v in by_status.values()),
+            "amount": sum(v["amount"] for v in by_status.values()),
+            "fees": sum(v["fees"] for v in by_status.values()),
+            "by_status": by_status
+        }
+    
+    @staticmethod
+    def archive_transfer_records(older_than: datetime, chunk_size: int = ARCHIVE_CHUNK) -> int:
+        """把 older_than 之前创建的终态记录从热表搬到归档表，返回搬运条数
+        每块在一个事务里 INSERT ... SELECT + DELETE，中途中断不会丢失或重复"""
+        hot, cold = TransferRecord.__table__, TransferRecordArchive.__table__
+        cols = [c.name for c in hot.columns]
+        moved = 0
+        while True:
+            with get_session() as session:
+                ids = session.exec(
+                    select(TransferRecord.id)
+                    .where(TransferRecord.status.in_(ARCHIVE_STATES))
+                    .where(TransferRecord.created < older_than)
+                    .limit(chunk_size)
+                ).all()
+                if not ids:
+                    break
+                session.execute(insert(cold).from_select(
+                    cols, select(*(hot.c[c] for c in cols)).where(hot.c.id.in_(ids))))
+                session.execute(delete(hot).where(hot.c.id.in_(ids)))
+                session.commit()
+            moved += len(ids)
+            if len(ids) < chunk_size:
+                break
+        return moved
     
     @staticmethod
     def create_batch_transfer_task(
@@ -225,28 +469,13 @@ class TransferService:
     async def check_transaction_status(signature: str) -> Dict[str, Any]:
         """检查交易状态"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    SOLANA_RPC_URL,
-                    json={
-                        "jsonrpc": "2.0",
-                        "id": 1,
-                        "method": "getSignatureStatuses",
-                        "params": [[signature], {"searchTransactionHistory": True}]
-                    },
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "result" in data and data["result"]["value"][0]:
-                        status_info = data["result"]["value"][0]
-                        return {
-                            "confirmed": status_info.get("confirmationStatus") == "finalized",
-                            "block_height": status_info.get("slot"),
-                            "error": status_info.get("err")
-                        }
-                        
+            status_info = (await rpc.get_signature_statuses([signature]))[0]
+            if status_info:
+                return {
+                    "confirmed": status_info.get("confirmationStatus") == "finalized",
+                    "block_height": status_info.get("slot"),
+                    "error": status_info.get("err")
+                }
         except Exception as e:
             logger.error(f"检查交易状态失败 {signature}: {e}")
             
@@ -256,22 +485,7 @@ class TransferService:
     async def get_recent_blockhash() -> Optional[str]:
         """获取最新区块哈希"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    SOLANA_RPC_URL,
-                    json={
-                        "jsonrpc": "2.0",
-                        "id": 1,
-                        "method": "getRecentBlockhash"
-                    },
-                    timeout=10.0
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if "result" in data:
-                        return data["result"]["value"]["blockhash"]
-                        
+            return await rpc.get_latest_blockhash()
         except Exception as e:
             logger.error(f"获取区块哈希失败: {e}")
             
@@ -286,4 +500,19 @@ class TransferService:
             "toPubkey": to_pubkey,
             "lamports": amount_lamports,
             "programId": "11111111111111111111111111111112"  # System Program
-        }
\ No newline at end of file
+        }
+
+
+async def archive_loop():
+    """定期归档过期的转账记录（应用启动时创建）"""
+    if TRANSFER_ARCHIVE_DAYS <= 0:
+        return
+    while True:
+        try:
+            cutoff = datetime.utcnow() - timedelta(days=TRANSFER_ARCHIVE_DAYS)
+            moved = await run_db(TransferService.archive_transfer_records, cutoff)
+            if moved:
+                logger.info(f"已归档 {moved} 条转账记录")
+        except Exception as e:
+            logger.error(f"归档转账记录失败: {e}")
+        await asyncio.sleep(TRANSFER_ARCHIVE_INTERVAL)
@@ -1,231 +1,367 @@
+import os
 import json
+import base64
+import uuid
 import base58
 import logging
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import List, Dict, Any, Optional, Iterable, Tuple
 from pathlib import Path
-import httpx
+from sqlalchemy import insert, update, delete, tuple_
 from sqlmodel import select
 
-from app.db import get_session
-from app.models import Wallet
+from app.db import get_session, run_db
+from app.cache import wallet_cache
+from app.rpc import rpc, LAMPORTS_PER_SOL
+from app.models import Wallet, WalletSeed, WalletKey
+from hdkeys import SEED_LEN, derive_secrets
 
 logger = logging.getLogger(__name__)
 
-# Solana RPC 端点（可以通过环境变量配置）
-SOLANA_RPC_URL = "https://api.mainnet-beta.solana.com"
-
 def add_wallet(public_key: str, secret_key: str, owner: str, name: Optional[str] = None, source: str = "generated") -> Wallet:
     """添加钱包到数据库"""
     with get_session() as session:
         wallet = Wallet(
             public_key=public_key,
-            secret_key=secret_key,
             owner=owner,
             name=name,
             source=source
         )
         session.add(wallet)
+        session.flush()
+        session.add(WalletKey(wallet_id=wallet.id, secret_key=secret_key))
+        session.expire_on_commit = False   # 会话即将关闭，返回的对象保持提交前的属性
         session.commit()
-        # 不需要 refresh，因为会话即将关闭
-        return wallet
+    wallet_cache.invalidate(owner)
+    return wallet
+
+BULK_CHUNK = 5000  # 批量写入时每次 executemany 的行数
+
+def _chunked(items: Iterable, size: int):
+    it = iter(items)
+    while batch := list(islice(it, size)):
+        yield batch
+
+def add_wallets_bulk(rows: Iterable[Dict[str, Any]], owner: str,
+                     chunk_size: int = BULK_CHUNK, on_chunk=None, before_commit=None) -> List[int]:
+    """批量添加钱包：单个事务内分块 executemany，返回与输入顺序一致的新 id
+    rows: {"public_key", "secret_key" | ("seed_id", "derivation_index"), "name"?, "source"?}
+    密钥写入 walletkey 表，与钱包行在同一事务
+    on_chunk(已写入数) 每块回调
+    before_commit(session) 在同一事务内提交前执行（用于写入检查点）"""
+    stmt = insert(Wallet.__table__).returning(Wallet.__table__.c.id, sort_by_parameter_order=True)
+    key_stmt = insert(WalletKey.__table__)
+    now = datetime.utcnow()
+    ids: List[int] = []
+    with get_session() as session:
+        for batch in _chunked(rows, chunk_size):
+            params = [{
+                "public_key": r["public_key"],
+                "owner": owner,
+                "name": r.get("name"),
+                "source": r.get("source", "generated"),
+                "created": now,
+            } for r in batch]
+            batch_ids = session.execute(stmt, params).scalars().all()
+            session.execute(key_stmt, [{
+                "wallet_id": wid,
+                "secret_key": r.get("secret_key"),
+                "seed_id": r.get("seed_id"),
+                "derivation_index": r.get("derivation_index"),
+            } for wid, r in zip(batch_ids, batch)])
+            ids.extend(batch_ids)
+            if on_chunk:
+                on_chunk(len(ids))
+        if before_commit:
+            before_commit(session)
+        session.commit()
+    wallet_cache.invalidate(owner)
+    return ids
+
+def _parse_wallet_item(item) -> Dict[str, Any]:
+    """解析单个钱包：solana-keygen 字节数组或 {"secret_key": [...], "public_key"?, "name"?}"""
+    if isinstance(item, list):
+        secret_list, public_key, name = item, None, None
+    elif isinstance(item, dict) and "secret_key" in item:
+        secret_list, public_key, name = item["secret_key"], item.get("public_key"), item.get("name")
+    else:
+        raise ValueError("不支持的钱包格式")
+
+    secret_bytes = bytes(secret_list)
+    if not public_key:
+        # 从私钥重建公钥
+        from solders.keypair import Keypair
+        public_key = str(Keypair.from_bytes(secret_bytes).pubkey())
+    return {
+        "public_key": public_key,
+        "secret_key": base58.b58encode(secret_bytes).decode(),
+        "name": name,
+        "source": "imported",
+    }
 
 def import_wallets_from_json(file_content: str, owner: str) -> List[Dict[str, Any]]:
     """从 JSON 文件导入钱包
     支持两种格式：
     1. solana-keygen 格式：[私钥字节数组]
     2. 扩展格式：{"secret_key": [...], "public_key": "...", ...}
+    以及由它们组成的数组（批量导入）
     """
     imported = []
+    rows = []
     try:
         data = json.loads(file_content)
-        
-        # 处理单个钱包
+
         if isinstance(data, list) and all(isinstance(x, int) for x in data):
-            # solana-keygen 格式
-            secret_bytes = bytes(data)
-            secret_b58 = base58.b58encode(secret_bytes).decode()
-            
-            # 重建公钥
-            from solders.keypair import Keypair
-            kp = Keypair.from_bytes(secret_bytes)
-            public_key = str(kp.pubkey())
-            
-            wallet = add_wallet(public_key, secret_b58, owner, source="imported")
-            imported.append({
-                "public_key": public_key,
-                "status": "success"
-            })
-            
+            # 单个 solana-keygen 格式
+            rows.append(_parse_wallet_item(data))
         elif isinstance(data, dict):
-            # 扩展格式
+            # 单个扩展格式
             if "secret_key" in data:
-                secret_list = data["secret_key"]
-                secret_bytes = bytes(secret_list)
-                secret_b58 = base58.b58encode(secret_bytes).decode()
-                
-                if "public_key" in data:
-                    public_key = data["public_key"]
-                else:
-                    # 从私钥重建公钥
-                    from solders.keypair import Keypair
-                    kp = Keypair.from_bytes(secret_bytes)
-                    public_key = str(kp.pubkey())
-                
-                wallet = add_wallet(public_key, secret_b58, owner, 
-                                  name=data.get("name"), source="imported")
-                imported.append({
-                    "public_key": public_key,
-                    "status": "success"
-                })
-                
+                rows.append(_parse_wallet_item(data))
         elif isinstance(data, list):
             # 批量导入
             for idx, item in enumerate(data):
+                if not (isinstance(item, list) or (isinstance(item, dict) and "secret_key" in item)):
+                    continue
                 try:
-                    if isinstance(item, list):
-                        # solana-keygen 格式数组
-                        secret_bytes = bytes(item)
-                        secret_b58 = base58.b58encode(secret_bytes).decode()
-                        
-                        from solders.keypair import Keypair
-                        kp = Keypair.from_bytes(secret_bytes)
-                        public_key = str(kp.pubkey())
-                        
-                        wallet = add_wallet(public_key, secret_b58, owner, source="imported")
-                        imported.append({
-                            "public_key": public_key,
-                            "status": "success"
-                        })
-                    elif isinstance(item, dict) and "secret_key" in item:
-                        # 扩展格式
-                        secret_list = item["secret_key"]
-                        secret_bytes = bytes(secret_list)
-                        secret_b58 = base58.b58encode(secret_bytes).decode()
-                        
-                        if "public_key" in item:
-                            public_key = item["public_key"]
-                        else:
-                            from solders.keypair import Keypair
-                            kp = Keypair.from_bytes(secret_bytes)
-                            public_key = str(kp.pubkey())
-                        
-                        wallet = add_wallet(public_key, secret_b58, owner, 
-                                          name=item.get("name"), source="imported")
-                        imported.append({
-                            "public_key": public_key,
-                            "status": "success"
-                        })
+                    rows.append(_parse_wallet_item(item))
                 except Exception as e:
                     imported.append({
                         "index": idx,
                         "status": "error",
                         "error": str(e)
                     })
-                    
+
     except Exception as e:
         logger.error(f"导入钱包失败: {e}")
         raise ValueError(f"无效的钱包文件格式: {e}")
-    
+
+    ids = add_wallets_bulk(rows, owner)
+    imported.extend({
+        "id": wallet_id,
+        "public_key": row["public_key"],
+        "status": "success"
+    } for wallet_id, row in zip(ids, rows))
     return imported
 
-def get_user_wallets(owner: str) -> List[Wallet]:
-    """获取用户的所有钱包"""
+# ---------- 钱包列表（游标分页） ----------
+WALLET_PAGE_SIZE = 100
+WALLET_PAGE_MAX  = 1000
+
+# 列表只取返回给前端的列，不读私钥
+WALLET_LIST_COLUMNS = (
+    Wallet.id, Wallet.public_key, Wallet.name, Wallet.source,
+    Wallet.created, Wallet.balance, Wallet.last_checked,
+)
+
+def encode_cursor(created: datetime, row_id: int) -> str:
+    raw = f"{created.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """游标格式错误时抛 ValueError"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(created), int(row_id)
+    except Exception:
+        raise ValueError("无效的 cursor")
+
+@wallet_cache.cached
+def list_wallets_page(
+    owner: str,
+    limit: int = WALLET_PAGE_SIZE,
+    cursor: Optional[str] = None,
+    source: Optional[str] = None,
+    name: Optional[str] = None,
+    min_balance: Optional[float] = None,
+    max_balance: Optional[float] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """按创建时间倒序返回一页钱包 ➜ (rows, next_cursor)
+    走 (owner, created, id) 索引定位游标位置，翻到多深都是一次索引查找"""
+    limit = max(1, min(limit, WALLET_PAGE_MAX))
+    stmt = select(*WALLET_LIST_COLUMNS).where(Wallet.owner == owner)
+    if source:
+        stmt = stmt.where(Wallet.source == source)
+    if name:
+        stmt = stmt.where(Wallet.name.icontains(name, autoescape=True))
+    if min_balance is not None:
+        stmt = stmt.where(Wallet.balance >= min_balance)
+    if max_balance is not None:
+        stmt = stmt.where(Wallet.balance <= max_balance)
+    if cursor:
+        created, row_id = decode_cursor(cursor)
+        stmt = stmt.where(tuple_(Wallet.created, Wallet.id) < (created, row_id))
+    stmt = stmt.order_by(Wallet.created.desc(), Wallet.id.desc()).limit(limit + 1)
+
     with get_session() as session:
-        return session.exec(
-            select(Wallet)
-            .where(Wallet.owner == owner)
-            .order_by(Wallet.created.desc())
-        ).all()
+        rows = session.exec(stmt).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created, rows[-1].id)
+    return [dict(r._mapping) for r in rows], next_cursor
+
+# ---------- HD 主种子 ----------
+def create_wallet_seed(owner: str) -> str:
+    """生成并保存一个随机主种子，返回 seed_id"""
+    seed_id = uuid.uuid4().hex[:12]
+    with get_session() as session:
+        session.add(WalletSeed(id=seed_id, owner=owner,
+                               seed=base58.b58encode(os.urandom(SEED_LEN)).decode()))
+        session.commit()
+    return seed_id
+
+def get_wallet_seed(seed_id: str) -> bytes:
+    with get_session() as session:
+        row = session.get(WalletSeed, seed_id)
+        if not row:
+            raise ValueError(f"主种子 {seed_id} 不存在")
+        return base58.b58decode(row.seed)
+
+SECRET_FETCH_CHUNK = 500   # IN 列表长度上限（SQLite 绑定参数有限制）
+
+def fetch_secrets(wallet_ids: List[int], owner: Optional[str] = None) -> Dict[int, bytes]:
+    """批量取私钥（导出 / 签名用）：wallet.id → 64 字节私钥
+    按块查询 walletkey 表；HD 钱包按主种子分组批量派生；指定 owner 时只返回该用户的钱包"""
+    secrets: Dict[int, bytes] = {}
+    by_seed: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+    with get_session() as session:
+        for batch in _chunked(wallet_ids, SECRET_FETCH_CHUNK):
+            stmt = select(WalletKey).where(WalletKey.wallet_id.in_(batch))
+            if owner is not None:
+                stmt = stmt.join(Wallet, Wallet.id == WalletKey.wallet_id).where(Wallet.owner == owner)
+            for key in session.exec(stmt):
+                if key.secret_key:
+                    secrets[key.wallet_id] = base58.b58decode(key.secret_key)
+                elif key.seed_id is not None:
+                    by_seed[key.seed_id].append((key.wallet_id, key.derivation_index))
+    for seed_id, group in by_seed.items():
+        derived = derive_secrets(get_wallet_seed(seed_id), [idx for _, idx in group])
+        secrets.update((wid, sk) for (wid, _), sk in zip(group, derived))
+    return secrets
 
 def export_wallets(wallet_ids: List[int], owner: str) -> List[Dict[str, Any]]:
-    """导出指定的钱包"""
+    """导出指定的钱包；缺少密钥的钱包（如迁移未完成的旧数据）按条目报错，不影响其它钱包
+    报错条目没有 secret_key，重新导入时会被跳过"""
     with get_session() as session:
         wallets = session.exec(
             select(Wallet)
             .where(Wallet.owner == owner)
             .where(Wallet.id.in_(wallet_ids))
         ).all()
-        
-        export_data = []
-        for wallet in wallets:
-            # 将 base58 私钥转回字节数组
-            secret_bytes = base58.b58decode(wallet.secret_key)
+
+    secrets = fetch_secrets([w.id for w in wallets])
+    export_data = []
+    for wallet in wallets:
+        secret_bytes = secrets.get(wallet.id)
+        if secret_bytes is None:
+            logger.warning(f"导出钱包 {wallet.id} 失败: 缺少私钥")
             export_data.append({
                 "public_key": wallet.public_key,
-                "secret_key": list(secret_bytes),
-                "secret_key_base58": wallet.secret_key,
                 "name": wallet.name,
-                "created": wallet.created.isoformat()
+                "status": "error",
+                "error": "缺少私钥"
             })
-        
-        return export_data
+            continue
+        export_data.append({
+            "public_key": wallet.public_key,
+            "secret_key": list(secret_bytes),
+            "secret_key_base58": base58.b58encode(secret_bytes).decode(),
+            "name": wallet.name,
+            "created": wallet.created.isoformat()
+        })
+
+    return export_data
 
-async def query_balances(wallet_ids: List[int], owner: str) -> Dict[str, float]:
-    """查询指定钱包的余额"""
+def _owned_wallets(owner: str, wallet_ids: List[int]) -> List[Wallet]:
     with get_session() as session:
-        wallets = session.exec(
+        return list(session.exec(
             select(Wallet)
             .where(Wallet.owner == owner)
             .where(Wallet.id.in_(wallet_ids))
-        ).all()
-        
-        balances = {}
-        
-        async with httpx.AsyncClient() as client:
-            for wallet in wallets:
-                try:
-                    # Solana RPC 调用获取余额
-                    response = await client.post(
-                        SOLANA_RPC_URL,
-                        json={
-                            "jsonrpc": "2.0",
-                            "id": 1,
-                            "method": "getBalance",
-                            "params": [wallet.public_key]
-                        }
-                    )
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if "result" in data:
-                            # 余额以 lamports 返回，需要转换为 SOL (1 SOL = 10^9 lamports)
-                            balance_lamports = data["result"]["value"]
-                            balance_sol = balance_lamports / 1e9
-                            balances[wallet.public_key] = balance_sol
-                            
-                            # 更新数据库中的余额缓存
-                            wallet.balance = balance_sol
-                            wallet.last_checked = datetime.utcnow()
-                        else:
-                            balances[wallet.public_key] = None
-                    else:
-                        balances[wallet.public_key] = None
-                        
-                except Exception as e:
-                    logger.error(f"查询钱包 {wallet.public_key} 余额失败: {e}")
-                    balances[wallet.public_key] = None
-        
-        # 保存更新的余额
+        ).all())
+
+def save_balances(updates: List[Dict[str, Any]], owner: Optional[str] = None):
+    """批量写回余额缓存：[{"id", "balance", "last_checked"}]，一次 executemany
+    owner 为空时不知道涉及哪些用户，清空整个列表缓存"""
+    if not updates:
+        return
+    with get_session() as session:
+        session.execute(update(Wallet), updates)
         session.commit()
-        
-        return balances
+    wallet_cache.invalidate(owner)
+
+# ---------- 余额缓存 ----------
+# Wallet.balance / last_checked 即余额缓存：在有效期内直接返回，不再查 RPC
+# WALLET_BALANCE_MAX_STALENESS  默认有效期（秒）；接口可以用 max_staleness 参数覆盖，0 表示强制刷新
+BALANCE_MAX_STALENESS = float(os.getenv("WALLET_BALANCE_MAX_STALENESS", "30"))
+
+def split_fresh_balances(wallets: List[Wallet], max_staleness: Optional[float] = None
+                         ) -> Tuple[Dict[str, float], List[Wallet]]:
+    """➜ ({地址: 缓存的余额}, 需要刷新的钱包)"""
+    if max_staleness is None:
+        max_staleness = BALANCE_MAX_STALENESS
+    cutoff = datetime.utcnow() - timedelta(seconds=max_staleness)
+    fresh, stale = {}, []
+    for wallet in wallets:
+        if (max_staleness > 0 and wallet.balance is not None
+                and wallet.last_checked and wallet.last_checked >= cutoff):
+            fresh[wallet.public_key] = wallet.balance
+        else:
+            stale.append(wallet)
+    return fresh, stale
+
+async def store_balances(wallets: List[Wallet], lamports: Dict[str, Optional[int]],
+                         owner: str) -> Dict[str, Optional[float]]:
+    """RPC 查到的余额（lamports）换算成 SOL 并批量写回；查询失败的为 None，不写回"""
+    balances = {}
+    updates = []
+    now = datetime.utcnow()
+    for wallet in wallets:
+        value = lamports.get(wallet.public_key)
+        if value is None:
+            balances[wallet.public_key] = None
+            continue
+        # 余额以 lamports 返回，需要转换为 SOL (1 SOL = 10^9 lamports)
+        balance_sol = value / LAMPORTS_PER_SOL
+        balances[wallet.public_key] = balance_sol
+        updates.append({"id": wallet.id, "balance": balance_sol, "last_checked": now})
+    await run_db(save_balances, updates, owner)
+    return balances
+
+async def query_balances(wallet_ids: List[int], owner: str,
+                         max_staleness: Optional[float] = None) -> Dict[str, Optional[float]]:
+    """查询指定钱包的余额：缓存有效的直接返回，其余批量查 RPC 并写回
+    读钱包、写回余额各在 DB 线程池里用一个短会话完成，等待 RPC 期间不占用会话 / 连接"""
+    wallets = await run_db(_owned_wallets, owner, wallet_ids)
+    balances, stale = split_fresh_balances(wallets, max_staleness)
+    if stale:
+        # 每 100 个地址一次 getMultipleAccounts，放在一个批量请求里
+        lamports = await rpc.get_balances([w.public_key for w in stale])
+        balances.update(await store_balances(stale, lamports, owner))
+    return balances
 
 def delete_wallets(wallet_ids: List[int], owner: str) -> int:
     """删除指定的钱包"""
     with get_session() as session:
-        wallets = session.exec(
-            select(Wallet)
+        ids = session.exec(
+            select(Wallet.id)
             .where(Wallet.owner == owner)
             .where(Wallet.id.in_(wallet_ids))
         ).all()
         
-        count = len(wallets)
-        for wallet in wallets:
-            session.delete(wallet)
+        if ids:
+            session.execute(delete(WalletKey).where(WalletKey.wallet_id.in_(ids)))
+            session.execute(delete(Wallet).where(Wallet.id.in_(ids)))
         
         session.commit()
-        return count
+    if ids:
+        wallet_cache.invalidate(owner)
+    return len(ids)
     
 def update_wallet_name(wallet_id: int, owner: str, name: str) -> Wallet:
     """更新钱包名称"""
@@ -238,4 +374,5 @@ def update_wallet_name(wallet_id: int, owner: str, name: str) -> Wallet:
         session.add(wallet)
         session.commit()
         session.refresh(wallet)
-        return wallet
\ No newline at end of file
+    wallet_cache.invalidate(owner)
+    return wallet
\ No newline at end of file
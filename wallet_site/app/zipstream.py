@@ -0,0 +1,101 @@
+import time
+import zlib
+import struct
+import tempfile
+from typing import Iterable, Iterator, Tuple
+
+# 边生成边输出的 zip（支持 zip64）：
+# 每个条目写完本地头 + 数据就可以发送，中央目录暂存在 SpooledTemporaryFile，内存占用有界
+
+_LOCAL     = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL   = struct.Struct("<IHHHHHHIIIHHHHHII")
+_ZIP64_EOCD = struct.Struct("<IQHHIIQQQQ")
+_ZIP64_LOC = struct.Struct("<IIQI")
+_EOCD      = struct.Struct("<IHHHHIIH")
+
+_FLAG_UTF8 = 0x0800
+_STORED, _DEFLATED = 0, 8
+_MAX32, _MAX16 = 0xFFFFFFFF, 0xFFFF
+
+CHUNK_SIZE  = 64 * 1024          # 攒够这么多字节再产出一次
+SPOOL_LIMIT = 8 * 1024 * 1024    # 中央目录超过这个大小就落到临时文件
+
+
+def _dos_datetime(ts: float) -> Tuple[int, int]:
+    t = time.localtime(ts)
+    return (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2), \
+           ((t.tm_year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+
+
+class ZipStream:
+    """按条目追加，entry() 返回应立即发送的字节，finish() 产出中央目录和结尾"""
+
+    def __init__(self, compress: bool = True):
+        self.method = _DEFLATED if compress else _STORED
+        self.offset = 0
+        self.count = 0
+        self._dos_time, self._dos_date = _dos_datetime(time.time())
+        self._central = tempfile.SpooledTemporaryFile(max_size=SPOOL_LIMIT)
+
+    def entry(self, name: str, data: bytes) -> bytes:
+        fname = name.encode("utf-8")
+        crc = zlib.crc32(data)
+        if self.method == _DEFLATED:
+            co = zlib.compressobj(6, zlib.DEFLATED, -15)
+            payload = co.compress(data) + co.flush()
+        else:
+            payload = data
+        if len(data) >= _MAX32 or len(payload) >= _MAX32:
+            raise ValueError(f"条目 {name} 过大")
+
+        header = _LOCAL.pack(0x04034B50, 20, _FLAG_UTF8, self.method,
+                             self._dos_time, self._dos_date,
+                             crc, len(payload), len(data), len(fname), 0)
+
+        # 偏移超过 4GB 时写 zip64 扩展字段
+        extra, offset, version = b"", self.offset, 20
+        if offset >= _MAX32:
+            extra = struct.pack("<HHQ", 0x0001, 8, offset)
+            offset, version = _MAX32, 45
+        self._central.write(_CENTRAL.pack(
+            0x02014B50, 0x0300 | 45, version, _FLAG_UTF8, self.method,
+            self._dos_time, self._dos_date, crc, len(payload), len(data),
+            len(fname), len(extra), 0, 0, 0, 0o644 << 16, offset) + fname + extra)
+
+        out = header + fname + payload
+        self.offset += len(out)
+        self.count += 1
+        return out
+
+    def finish(self) -> Iterator[bytes]:
+        cd_offset = self.offset
+        cd_size = self._central.tell()
+        self._central.seek(0)
+        while block := self._central.read(CHUNK_SIZE):
+            yield block
+        self._central.close()
+
+        tail = b""
+        if self.count >= _MAX16 or cd_offset >= _MAX32 or cd_size >= _MAX32:
+            eocd64_offset = cd_offset + cd_size
+            tail += _ZIP64_EOCD.pack(0x06064B50, 44, 45, 45, 0, 0,
+                                     self.count, self.count, cd_size, cd_offset)
+            tail += _ZIP64_LOC.pack(0x07064B50, 0, eocd64_offset, 1)
+        tail += _EOCD.pack(0x06054B50, 0, 0,
+                           min(self.count, _MAX16), min(self.count, _MAX16),
+                           min(cd_size, _MAX32), min(cd_offset, _MAX32), 0)
+        yield tail
+
+
+def stream_zip(entries: Iterable[Tuple[str, bytes]], compress: bool = True) -> Iterator[bytes]:
+    """把 (文件名, 内容) 序列编码成 zip 字节流，按 CHUNK_SIZE 左右分块产出"""
+    zs = ZipStream(compress)
+    buf = bytearray()
+    for name, data in entries:
+        buf += zs.entry(name, data)
+        if len(buf) >= CHUNK_SIZE:
+            yield bytes(buf)
+            buf.clear()
+    if buf:
+        yield bytes(buf)
+    yield from zs.finish()
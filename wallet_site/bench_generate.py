@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# bench_generate.py  —— 钱包生成基准：keys/s、输出字节/s、数据库行/s、峰值 RSS，结果写 JSON 便于跨提交对比
+import os, sys, json, time, shutil, argparse, platform, resource, subprocess, tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+KINDS   = ("generate", "job", "db")
+FORMATS = ("pack", "hd", "keygen")
+DB_SINGLE_SAMPLE = 2000   # 逐行 add_wallet 只测这么多行，再按速率折算
+
+
+# ---------- 单个用例（在独立子进程、独立临时目录中运行） ----------
+def _dir_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs)
+
+def _peak_rss_mb() -> float:
+    # Linux 下 ru_maxrss 单位为 KB；子进程（密钥生成进程池）单独统计
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / 1024, 1)
+
+def case_generate(size: int, procs: int, fmt: str, work: str) -> dict:
+    from bulk_generate import batch_generate, pubkey_of
+    from keypack import KeyPack, pack_path, export_keygen_files
+    from hdkeys import SEED_LEN
+
+    out_dir = os.path.join(work, "out")
+    t0 = time.perf_counter()
+    count = batch_generate(size, 0, 0, 1, out_dir, procs=procs,
+                           hd_seed=os.urandom(SEED_LEN) if fmt == "hd" else None)
+    if fmt == "keygen":
+        with KeyPack(pack_path(out_dir)) as pack:
+            export_keygen_files(pack, out_dir)
+    elif fmt == "hd":
+        # HD 打包文件只存种子，生成阶段不做派生；这里逐个派生出地址，keys/s 才是真实的派生速率
+        with KeyPack(pack_path(out_dir)) as pack:
+            for _, secret in pack.iter_secrets():
+                pubkey_of(secret)
+    elapsed = time.perf_counter() - t0
+    out_bytes = _dir_bytes(out_dir)
+    return {"keys": count, "seconds": elapsed,
+            "keys_per_s": count / elapsed,
+            "output_bytes": out_bytes, "output_bytes_per_s": out_bytes / elapsed}
+
+def case_job(size: int, procs: int, fmt: str, work: str) -> dict:
+    os.environ["WALLET_JOB_DIR"] = work
+    from app.auth import upsert_user
+    from app.generator import create_generate_job, run_generate_job, job_dir
+    from app.service import get_job
+
+    owner = "bench"
+    upsert_user(owner)
+    args = dict(num=size, min_delay=0, max_delay=0, workers=1, procs=procs, hd=(fmt == "hd"))
+    marks = {}
+
+    def report(fields):
+        now = time.perf_counter()
+        for k in ("generated", "persisted", "archived"):
+            if k in fields:
+                marks.setdefault(k + "_first", now)
+                marks[k] = now
+
+    t0 = time.perf_counter()
+    job_id = create_generate_job(args, owner)
+    run_generate_job(job_id, args, owner, report=report)
+    elapsed = time.perf_counter() - t0
+    job = get_job(job_id)
+    if job.status != "completed":
+        raise RuntimeError(job.error_message)
+
+    # 入库阶段：最后一次生成进度 → 最后一次入库进度
+    persist_s = max(marks.get("persisted", t0) - marks.get("generated", t0), 1e-9)
+    out_bytes = _dir_bytes(str(job_dir(job_id)))
+    return {"keys": job.count, "seconds": elapsed,
+            "keys_per_s": job.count / elapsed,
+            "output_bytes": out_bytes, "output_bytes_per_s": out_bytes / elapsed,
+            "db_rows_per_s": job.persisted / persist_s}
+
+def case_db(size: int, procs: int, fmt: str, work: str) -> dict:
+    import base58
+    from app.auth import upsert_user
+    from app.wallet_service import add_wallet, add_wallets_bulk
+    from bulk_generate import iter_secret_chunks, pubkey_of, SECRET_LEN
+
+    owner = "bench"
+    upsert_user(owner)
+    sample_n = min(size, DB_SINGLE_SAMPLE)
+    rows = []
+    for data in iter_secret_chunks(size + sample_n, procs):
+        rows.extend({"public_key": pubkey_of(data[off:off + SECRET_LEN]),
+                     "secret_key": base58.b58encode(data[off:off + SECRET_LEN]).decode()}
+                    for off in range(0, len(data), SECRET_LEN))
+
+    sample, rows = rows[:sample_n], rows[sample_n:]
+    t0 = time.perf_counter()
+    for r in sample:
+        add_wallet(r["public_key"], r["secret_key"], owner)
+    single_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    ids = add_wallets_bulk(rows, owner)
+    bulk_s = time.perf_counter() - t0
+    return {"keys": len(ids), "seconds": bulk_s,
+            "db_rows_per_s": len(ids) / bulk_s,
+            "db_single_rows_per_s": len(sample) / single_s}
+
+CASES = {"generate": case_generate, "job": case_job, "db": case_db}
+
+def run_case(kind: str, size: int, procs: int, fmt: str, result_file: str):
+    work = tempfile.mkdtemp(prefix="wallet_bench_")
+    try:
+        os.chdir(work)
+        # 数据库落在临时目录，不碰正式库
+        os.environ["WALLET_DB_URL"] = f"sqlite:///{os.path.join(work, 'bench.db')}"
+        import logging
+        logging.disable(logging.WARNING)
+        if kind in ("job", "db"):
+            from app.migrations import upgrade
+            upgrade()               # 临时库先建表
+        result = CASES[kind](size, procs, fmt, work)
+        result["peak_rss_mb"] = _peak_rss_mb()
+    finally:
+        os.chdir(HERE)
+        shutil.rmtree(work, ignore_errors=True)
+    with open(result_file, "w") as f:
+        json.dump(result, f)
+
+
+# ---------- 调度 / 汇总 ----------
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=HERE,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+def _case_key(r: dict) -> tuple:
+    return r["kind"], r["format"], r["size"], r["procs"]
+
+def _matrix(args):
+    for kind in args.kinds:
+        for fmt in args.formats:
+            if kind == "job" and fmt == "keygen":      # 任务只产出打包文件
+                continue
+            if kind == "db" and fmt != "pack":         # 入库与输出格式无关，只跑一次
+                continue
+            for size in args.sizes:
+                for procs in args.procs:
+                    yield kind, fmt, size, procs
+
+def main():
+    ap = argparse.ArgumentParser(description="钱包生成基准测试")
+    ap.add_argument("--kinds", default=",".join(KINDS), help=f"用例类型，逗号分隔：{'/'.join(KINDS)}")
+    ap.add_argument("--formats", default=",".join(FORMATS), help=f"输出格式：{'/'.join(FORMATS)}")
+    ap.add_argument("--sizes", default="1000,100000,1000000", help="钱包数量，逗号分隔")
+    ap.add_argument("--procs", default=f"1,{os.cpu_count() or 1}", help="生成进程数，逗号分隔")
+    ap.add_argument("-o", "--out", default="bench_results.json", help="结果 JSON 文件")
+    ap.add_argument("--compare", default=None, help="与之前的结果 JSON 对比，打印变化百分比")
+    ap.add_argument("--case", nargs=5, metavar=("KIND", "SIZE", "PROCS", "FORMAT", "RESULT"),
+                    help=argparse.SUPPRESS)    # 内部：子进程执行单个用例
+    args = ap.parse_args()
+
+    if args.case:
+        kind, size, procs, fmt, result_file = args.case
+        run_case(kind, int(size), int(procs), fmt, result_file)
+        return
+
+    args.kinds   = [k for k in args.kinds.split(",") if k]
+    args.formats = [f for f in args.formats.split(",") if f]
+    args.sizes   = [int(s) for s in args.sizes.split(",") if s]
+    args.procs   = sorted({int(p) for p in args.procs.split(",") if p})
+    for k in args.kinds:
+        if k not in KINDS:
+            ap.error(f"未知用例类型 {k}")
+    for f in args.formats:
+        if f not in FORMATS:
+            ap.error(f"未知输出格式 {f}")
+
+    results = []
+    for kind, fmt, size, procs in _matrix(args):
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            result_file = tmp.name
+        cmd = [sys.executable, os.path.abspath(__file__),
+               "--case", kind, str(size), str(procs), fmt, result_file]
+        proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        row = {"kind": kind, "format": fmt, "size": size, "procs": procs}
+        if proc.returncode == 0:
+            with open(result_file) as f:
+                row.update(json.load(f))
+        else:
+            row["error"] = proc.stderr.decode(errors="replace").strip().splitlines()[-1:]
+        os.unlink(result_file)
+        results.append(row)
+        print(json.dumps(row, ensure_ascii=False), flush=True)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"结果已写入 {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            base = {_case_key(r): r for r in json.load(f)["results"]}
+        print(f"对比 {args.compare}：")
+        for r in results:
+            old = base.get(_case_key(r))
+            if not old:
+                continue
+            diffs = []
+            for metric in ("keys_per_s", "output_bytes_per_s", "db_rows_per_s", "peak_rss_mb"):
+                if r.get(metric) and old.get(metric):
+                    diffs.append(f"{metric} {100 * (r[metric] / old[metric] - 1):+.1f}%")
+            print(f"  {r['kind']}/{r['format']} size={r['size']} procs={r['procs']}: " + ", ".join(diffs))
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
-# bulk_generate.py  —— 批量生成 Solana 钱包：solana-keygen + Phantom 双兼容，带实时日志
-import os, json, time, random, argparse, logging, base58
+# bulk_generate.py  —— 批量生成 Solana 钱包：打包输出（可展开为 solana-keygen 文件），带实时日志
+import os, time, heapq, random, argparse, logging, base58, multiprocessing
+from collections import deque
+from itertools import repeat
 from logging.handlers import RotatingFileHandler
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor
+from nacl.bindings import crypto_sign_seed_keypair
+from keypack import KeyPack, KeyPackWriter, pack_path, export_keygen_files
+from hdkeys import SEED_LEN
 
 # ---------- 兼容导入 ----------
 try:                                   # solana-py 0.30–0.35
@@ -17,7 +22,9 @@ def _new_keypair():                    # ➜ Keypair
     return Keypair.generate() if (not _NEW_API and hasattr(Keypair, "generate")) else Keypair()
 
 def _secret_bytes(kp):                 # ➜ bytes
-    return kp.to_bytes() if hasattr(kp, "to_bytes") else kp.secret_key
+    if hasattr(kp, "to_bytes"):
+        return kp.to_bytes()
+    return bytes(kp) if _NEW_API else kp.secret_key   # solders 只支持 bytes(kp)
 
 def _pubkey_str(kp):                   # ➜ str
     return str(kp.pubkey() if hasattr(kp, "pubkey") else kp.public_key)
@@ -32,69 +39,240 @@ def setup_logger(level: str, logfile="bulk_generate.log"):
     fh = RotatingFileHandler(logfile, maxBytes=2*1024*1024, backupCount=3, encoding="utf-8")
     fh.setFormatter(fmt); lg.addHandler(fh)
 
-# ---------- 等待进度 ----------
-def _wait(delay: float, idx: int, tick: float = 5.0):
-    lg = logging.getLogger()
-    lg.info("wallet #%d 正在等待中，总计 %.2f 秒…", idx, delay)
-    remain = delay
-    while remain > 0:
-        step = min(tick, remain)
-        time.sleep(step)
-        remain -= step
-        if remain > 0:
-            lg.debug("wallet #%d 剩余 %.2f 秒", idx, remain)
-
-# ---------- 单个生成 ----------
-def gen_one(idx: int, out_dir: str, min_d: float, max_d: float):
+# ---------- 放行节奏 ----------
+RELEASE_TICK = 1.0     # 等待放行时单次最长休眠（秒）
+
+class ReleaseScheduler:
+    """按 min/max 间隔放行钱包，不占用等待线程：
+    lanes 条通道（等效旧版的线程数），每条通道相邻两次放行间隔 uniform(min_d, max_d)，
+    最小堆记录各通道下一次可放行的时刻，调用方按到期时间批量放行"""
+
+    def __init__(self, lanes: int, min_d: float, max_d: float):
+        self.min_d, self.max_d = min_d, max_d
+        self._due = [time.monotonic()] * max(1, lanes)
+
+    def next_due(self) -> float:
+        return self._due[0]
+
+    def take_due(self, limit: int, now: float = None) -> int:
+        """放行至多 limit 个到期的名额，返回实际放行数"""
+        now = time.monotonic() if now is None else now
+        n = 0
+        while n < limit and self._due[0] <= now:
+            heapq.heapreplace(self._due, self._due[0] + random.uniform(self.min_d, self.max_d))
+            n += 1
+        return n
+
+# ---------- 多进程密钥引擎 ----------
+SECRET_LEN = 64        # 私钥 = 32 字节 seed + 32 字节公钥
+CHUNK_SIZE = 4096      # 每个子进程任务一次生成的密钥数
+
+def _gen_chunk(count: int) -> bytes:  # ➜ count × 64 字节紧凑私钥
+    """子进程入口：连续生成 count 个密钥，只回传拼接后的私钥字节"""
+    return b"".join(_secret_bytes(_new_keypair()) for _ in range(count))
+
+def pubkey_of(secret: bytes) -> str:
+    """64 字节私钥的后 32 字节即公钥，无需重建 Keypair"""
+    return base58.b58encode(secret[32:SECRET_LEN]).decode()
+
+def default_procs() -> int:
+    return os.cpu_count() or 1
+
+def _pool_map(fn, args, procs: int):
+    """有序产出 fn(*arg) 的结果：进程池执行，在途任务数 ≤ 2×procs；procs ≤ 1 时在本进程执行
+    args 可以是无限迭代器，调用方停止迭代时取消剩余任务"""
+    if procs <= 1:
+        for a in args:
+            yield fn(*a)
+        return
+
+    ctx = multiprocessing.get_context("spawn")   # 避免在多线程的 uvicorn 中 fork
+    pool = ProcessPoolExecutor(max_workers=procs, mp_context=ctx)
+    try:
+        it = iter(args)
+        pending = deque(pool.submit(fn, *a) for _, a in zip(range(procs * 2), it))
+        while pending:
+            result = pending.popleft().result()
+            nxt = next(it, None)
+            if nxt is not None:
+                pending.append(pool.submit(fn, *nxt))
+            yield result
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def iter_secret_chunks(total: int, procs: int, chunk: int = CHUNK_SIZE):
+    """按顺序产出私钥块（bytes），由进程池分片并行生成"""
+    sizes = ((min(chunk, total - i),) for i in range(0, total, chunk))
+    yield from _pool_map(_gen_chunk, sizes, procs)
+
+# ---------- 靓号搜索 ----------
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+VANITY_BATCH = 20000   # 每个子进程任务的尝试次数
+
+class VanityPattern:
+    """base58 前缀 / 后缀匹配，直接在 32 字节公钥整数上判断，不做 base58 编码：
+    前缀 ⇔ 整数落在对应区间（43、44 位两种长度），后缀 ⇔ 整数 mod 58^k"""
+
+    def __init__(self, prefix: str = "", suffix: str = ""):
+        bad = set(prefix + suffix) - set(B58_ALPHABET)
+        if bad:
+            raise ValueError(f"包含非 base58 字符: {''.join(sorted(bad))}")
+        if not prefix and not suffix:
+            raise ValueError("prefix 和 suffix 至少指定一个")
+        self.prefix, self.suffix = prefix, suffix
+        self.suffix_mod = 58 ** len(suffix)
+        self.suffix_val = self._value(suffix)
+
+        # 首字节非 0 时地址为 43 或 44 位；前缀以 '1' 开头只可能来自首字节为 0，走慢路径
+        self.ranges = []
+        if prefix:
+            for length in (43, 44):
+                scale = 58 ** (length - len(prefix))
+                lo = max(self._value(prefix) * scale, 58 ** (length - 1), 1 << 248)
+                hi = min((self._value(prefix) + 1) * scale, 58 ** length, 1 << 256)
+                if lo < hi:
+                    self.ranges.append((lo, hi))
+
+    @staticmethod
+    def _value(s: str) -> int:
+        v = 0
+        for ch in s:
+            v = v * 58 + B58_ALPHABET.index(ch)
+        return v
+
+    def matches(self, pk: bytes) -> bool:
+        if pk[0] == 0:                      # 约 1/256：有前导 '1'，直接编码比较
+            addr = base58.b58encode(pk).decode()
+            return addr.startswith(self.prefix) and addr.endswith(self.suffix)
+        n = int.from_bytes(pk, "big")
+        if self.suffix and n % self.suffix_mod != self.suffix_val:
+            return False
+        return not self.prefix or any(lo <= n < hi for lo, hi in self.ranges)
+
+    def probability(self) -> float:
+        """单次尝试命中的概率（忽略首字节为 0 的情况）"""
+        p = sum(hi - lo for lo, hi in self.ranges) / (1 << 256) if self.prefix else 1.0
+        return p / self.suffix_mod
+
+def _vanity_chunk(pattern: VanityPattern, attempts: int) -> bytes:  # ➜ 命中的 64 字节私钥拼接
+    """子进程入口：seed → 原始公钥字节直接比对，只有命中的才拼出私钥"""
+    seeds = os.urandom(32 * attempts)
+    found = []
+    for off in range(0, len(seeds), 32):
+        pk, sk = crypto_sign_seed_keypair(seeds[off:off + 32])
+        if pattern.matches(pk):
+            found.append(sk)
+    return b"".join(found)
+
+def iter_vanity_chunks(pattern: VanityPattern, total: int, procs: int, on_stats=None):
+    """多进程搜索靓号，按发现顺序产出私钥块；找满 total 个即停止
+    on_stats({"attempts", "rate", "eta"}) 每个任务完成后回调"""
     lg = logging.getLogger()
-    kp = _new_keypair()
-    secret_bytes = _secret_bytes(kp)
-    secret_list  = list(secret_bytes)
-    pubkey       = _pubkey_str(kp)
-    b58_secret   = base58.b58encode(secret_bytes).decode()
-
-    # ① solana-keygen 兼容文件
-    with open(os.path.join(out_dir, f"wallet_{idx}.json"), "w") as f:
-        json.dump(secret_list, f)
-
-    # ② 附带信息文件
-    with open(os.path.join(out_dir, f"wallet_{idx}_info.json"), "w") as f:
-        json.dump({
-            "secret_key"        : secret_list,
-            "secret_key_base58" : b58_secret,
-            "public_key"        : pubkey
-        }, f, indent=2)
-
-    lg.info("生成完成 #%d → %s", idx, pubkey)
-    _wait(random.uniform(min_d, max_d), idx)
-    return pubkey
+    p = pattern.probability()
+    found = attempts = 0
+    t0 = time.time()
+    for data in _pool_map(_vanity_chunk, repeat((pattern, VANITY_BATCH)), procs):
+        attempts += VANITY_BATCH
+        rate = attempts / max(time.time() - t0, 1e-9)
+        if data:
+            data = data[:(total - found) * SECRET_LEN]
+            found += len(data) // SECRET_LEN
+        eta = (total - found) / p / rate if p > 0 else None
+        stats = {"attempts": attempts, "rate": round(rate), "eta": round(eta, 1) if eta is not None else None}
+        lg.info("靓号搜索：命中 %d/%d，尝试 %d 次（%.0f 次/秒，预计剩余 %s 秒）",
+                found, total, attempts, rate, stats["eta"])
+        if on_stats:
+            on_stats(stats)
+        if data:
+            yield data
+        if found >= total:
+            return
 
 # ---------- 批量 ----------
-def batch_generate(total, min_d, max_d, workers, out_dir):
+def batch_generate(total, min_d, max_d, workers, out_dir, procs=None, on_progress=None,
+                   vanity=None, on_stats=None, resume=False, on_release=None, released=None,
+                   hd_seed=None):
+    """进程池全速生成密钥 → 追加写入 out_dir/wallets.pack；返回打包文件中的钱包数
+    生成不受 min/max 间隔限制，间隔只作用于放行：on_release(已放行数) 按 ReleaseScheduler 节奏回调
+    on_progress(已生成数) 在每个块落盘后回调；vanity 为 VanityPattern 时只保留匹配的地址
+    resume=True 时从打包文件已提交的记录数续写；released 为已放行的序号（默认视为已生成的都已放行）
+    hd_seed 不为空时为 HD 模式：打包文件只存主种子，钱包按 m/44'/501'/i'/0' 派生，不落私钥"""
     lg = logging.getLogger()
+    procs = procs or default_procs()
     os.makedirs(out_dir, exist_ok=True)
-    lg.info("开始生成 %d 个钱包（线程=%d，间隔 %.2f–%.2f 秒）", total, workers, min_d, max_d)
+    sched = ReleaseScheduler(workers, min_d, max_d)
+    if vanity and hd_seed:
+        raise ValueError("靓号搜索不能与 HD 模式同时使用")
+
+    with KeyPackWriter(pack_path(out_dir), resume=resume, hd_seed=hd_seed) as writer:
+        done = writer.count if released is None else min(released, writer.count)
+
+        def _release(wait: bool):
+            # 放行已到期的；wait=True 时一直等到全部放行
+            nonlocal done
+            while done < writer.count:
+                n = sched.take_due(writer.count - done)
+                if n:
+                    done += n
+                    if on_release:
+                        on_release(done)
+                    lg.debug("已放行 %d/%d", done, total)
+                elif not wait:
+                    return
+                else:
+                    time.sleep(min(max(sched.next_due() - time.monotonic(), 0), RELEASE_TICK))
 
-    pubs = []
-    with ThreadPoolExecutor(max_workers=workers) as pool:
-        futures = {pool.submit(gen_one, i, out_dir, min_d, max_d): i for i in range(total)}
-        for fut in as_completed(futures):
-            try:
-                pubs.append(fut.result())
-            except Exception as e:
-                lg.error("wallet #%d 失败: %s", futures[fut], e, exc_info=True)
+        remaining = total - writer.count
+        lg.info("开始生成 %d 个钱包（已有 %d，进程=%d，放行通道=%d，间隔 %.2f–%.2f 秒%s）",
+                total, writer.count, procs, workers, min_d, max_d,
+                f"，靓号 {vanity.prefix}…{vanity.suffix}" if vanity else
+                ("，HD 派生" if writer.hd else ""))
+        if remaining <= 0:
+            source = ()
+        elif writer.hd:    # 派生按需进行，这里只推进序号
+            source = (min(CHUNK_SIZE, remaining - i) for i in range(0, remaining, CHUNK_SIZE))
+        elif vanity:
+            source = iter_vanity_chunks(vanity, remaining, procs, on_stats)
+        else:
+            source = iter_secret_chunks(remaining, procs)
 
-    lg.info("✅ 全部完成，共 %d 个钱包；文件位于 %s/", len(pubs), out_dir)
-    return pubs
+        t0, start = time.time(), writer.count
+        for data in source:
+            if writer.hd:
+                writer.advance(data)
+            else:
+                writer.append(data)
+            writer.commit()
+            if on_progress:
+                on_progress(writer.count)
+            lg.info("进度 %d/%d（%.0f 个/秒）", writer.count, total,
+                    (writer.count - start) / max(time.time() - t0, 1e-9))
+            _release(wait=False)
+        _release(wait=True)
+        count = writer.count
+
+    lg.info("✅ 全部完成，共 %d 个钱包；文件位于 %s", count, pack_path(out_dir))
+    return count
 
 # ---------- CLI ----------
 if __name__ == "__main__":
-    ap = argparse.ArgumentParser(description="批量生成 Solana 钱包，双格式输出 + 实时日志")
+    ap = argparse.ArgumentParser(description="批量生成 Solana 钱包，打包输出 + 实时日志")
     ap.add_argument("-n", "--num", type=int, default=100, help="生成数量")
     ap.add_argument("--min-delay", type=float, default=0.1, help="最小间隔秒")
     ap.add_argument("--max-delay", type=float, default=0.5, help="最大间隔秒")
-    ap.add_argument("-w", "--workers", type=int, default=4, help="并发线程数")
+    ap.add_argument("-w", "--workers", type=int, default=4,
+                    help="放行通道数：每条通道按间隔依次放行（等效旧版并发线程数）")
+    ap.add_argument("-p", "--procs", type=int, default=default_procs(), help="密钥生成进程数")
     ap.add_argument("-o", "--out", default="wallets", help="输出目录")
+    ap.add_argument("--prefix", default="", help="靓号：地址前缀（base58）")
+    ap.add_argument("--suffix", default="", help="靓号：地址后缀（base58）")
+    ap.add_argument("--keygen-files", action="store_true",
+                    help="额外把 wallets.pack 展开为逐钱包 solana-keygen JSON 文件")
+    ap.add_argument("--hd", action="store_true",
+                    help="HD 模式：只保存一个主种子，钱包按 m/44'/501'/i'/0' 派生")
+    ap.add_argument("--seed", default=None, help="HD 主种子（128 位十六进制），默认随机生成")
+    ap.add_argument("--resume", action="store_true",
+                    help="从已有 wallets.pack 的断点继续，只生成剩余部分")
     ap.add_argument("--log-level", default="INFO",
                     choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"])
     args = ap.parse_args()
@@ -104,5 +282,19 @@ if __name__ == "__main__":
     if args.min_delay > args.max_delay:
         raise ValueError("min-delay 不能大于 max-delay")
 
+    if args.procs < 1:
+        raise ValueError("procs 必须 ≥ 1")
+
+    vanity = VanityPattern(args.prefix, args.suffix) if (args.prefix or args.suffix) else None
+    hd_seed = None
+    if args.hd or args.seed:
+        hd_seed = bytes.fromhex(args.seed) if args.seed else os.urandom(SEED_LEN)
+        if len(hd_seed) != SEED_LEN:
+            raise ValueError(f"--seed 必须是 {SEED_LEN} 字节")
+
     setup_logger(args.log_level)
-    batch_generate(args.num, args.min_delay, args.max_delay, args.workers, args.out)
+    batch_generate(args.num, args.min_delay, args.max_delay, args.workers, args.out, args.procs,
+                   vanity=vanity, resume=args.resume, hd_seed=hd_seed)
+    if args.keygen_files:
+        with KeyPack(pack_path(args.out)) as pack:
+            export_keygen_files(pack, args.out)
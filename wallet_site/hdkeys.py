@@ -0,0 +1,42 @@
+# hdkeys.py  —— 主种子派生 Solana 钱包（SLIP-0010 ed25519，路径 m/44'/501'/i'/0'，与 Phantom / solana-keygen 一致）
+import hmac, hashlib
+from typing import Iterable, List, Tuple
+from nacl.bindings import crypto_sign_seed_keypair
+
+SEED_LEN     = 64
+HARDENED     = 0x80000000
+SOLANA_PATH  = "m/44'/501'/{index}'/0'"
+
+Node = Tuple[bytes, bytes]   # (私钥, chain code)
+
+
+def _hmac512(key: bytes, data: bytes) -> Node:
+    i = hmac.new(key, data, hashlib.sha512).digest()
+    return i[:32], i[32:]
+
+
+def master_node(seed: bytes) -> Node:
+    return _hmac512(b"ed25519 seed", seed)
+
+
+def child_node(node: Node, index: int) -> Node:
+    """ed25519 只支持硬化派生"""
+    key, chain = node
+    return _hmac512(chain, b"\x00" + key + (index | HARDENED).to_bytes(4, "big"))
+
+
+def account_root(seed: bytes) -> Node:
+    """m/44'/501'：各钱包共用，批量派生时只算一次"""
+    return child_node(child_node(master_node(seed), 44), 501)
+
+
+def derive_secret(root: Node, index: int) -> bytes:
+    """➜ 第 index 个钱包的 64 字节私钥（seed + 公钥）"""
+    key, _ = child_node(child_node(root, index), 0)
+    return crypto_sign_seed_keypair(key)[1]
+
+
+def derive_secrets(seed: bytes, indexes: Iterable[int]) -> List[bytes]:
+    """批量派生，共用 m/44'/501' 节点"""
+    root = account_root(seed)
+    return [derive_secret(root, i) for i in indexes]
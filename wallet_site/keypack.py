@@ -0,0 +1,189 @@
+# keypack.py  —— 生成任务的打包输出：一个文件 = 头部索引 + 定长 64 字节私钥记录，mmap 只读访问
+#               HD 模式下头部后只有一个 64 字节主种子，count 个钱包的私钥按序号即时派生
+import os, json, mmap, struct, base58
+from hdkeys import SEED_LEN, account_root, derive_secret
+
+PACK_NAME   = "wallets.pack"
+RECORD_SIZE = 64                                   # 32 字节 seed + 32 字节公钥
+MAGIC       = b"WKPACK\x00\x01"
+VERSION     = 1
+
+# 头部：magic | version | record_size | flags | count（已提交记录数）
+# 记录定长，第 i 条位于 HEADER.size + i * RECORD_SIZE，头部的 count 即为索引
+HEADER = struct.Struct("<8sHHIQ8x")
+
+FLAG_HD = 0x1   # 头部后是主种子，没有逐钱包记录
+
+
+class KeyPackError(ValueError):
+    pass
+
+
+def pack_path(out_dir) -> str:
+    return os.path.join(str(out_dir), PACK_NAME)
+
+
+# ---------- 写 ----------
+class KeyPackWriter:
+    """顺序追加私钥块；commit() 落盘后才更新头部 count
+    resume=True 时打开已有文件，丢弃头部 count 之后未提交的记录继续追加
+    hd_seed 不为空时写 HD 打包文件：只保存主种子，用 advance() 记录已派生的钱包数"""
+
+    def __init__(self, path: str, flags: int = 0, resume: bool = False, hd_seed: bytes = None):
+        self.path  = path
+        self.flags = flags | (FLAG_HD if hd_seed else 0)
+        self.count = 0
+        if resume and os.path.exists(path) and os.path.getsize(path) >= HEADER.size:
+            self._f = open(path, "r+b")
+            magic, version, rec, self.flags, self.count = HEADER.unpack(self._f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION or rec != RECORD_SIZE:
+                self._f.close()
+                raise KeyPackError(f"{path} 头部不匹配")
+            self._f.truncate(self._data_offset() + self.count * self.record_size)
+            self._f.seek(0, os.SEEK_END)
+        else:
+            if hd_seed is not None and len(hd_seed) != SEED_LEN:
+                raise KeyPackError(f"主种子必须是 {SEED_LEN} 字节")
+            self._f = open(path, "wb")
+            self._f.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, self.flags, 0))
+            if hd_seed:
+                self._f.write(hd_seed)
+
+    @property
+    def hd(self) -> bool:
+        return bool(self.flags & FLAG_HD)
+
+    @property
+    def record_size(self) -> int:
+        return 0 if self.hd else RECORD_SIZE
+
+    def _data_offset(self) -> int:
+        return HEADER.size + (SEED_LEN if self.hd else 0)
+
+    def advance(self, n: int) -> int:
+        """HD 模式：记录又派生了 n 个钱包"""
+        if not self.hd:
+            raise KeyPackError("只有 HD 打包文件可以 advance")
+        self.count += n
+        return self.count
+
+    def append(self, data: bytes) -> int:
+        if self.hd:
+            raise KeyPackError("HD 打包文件不保存私钥记录")
+        if len(data) % RECORD_SIZE:
+            raise KeyPackError(f"数据长度 {len(data)} 不是 {RECORD_SIZE} 的整数倍")
+        self._f.write(data)
+        self.count += len(data) // RECORD_SIZE
+        return self.count
+
+    def commit(self):
+        self._f.flush()
+        os.fsync(self._f.fileno())
+        self._f.seek(0)
+        self._f.write(HEADER.pack(MAGIC, VERSION, RECORD_SIZE, self.flags, self.count))
+        self._f.seek(0, os.SEEK_END)
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def close(self):
+        if not self._f.closed:
+            self.commit()
+            self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- 读 ----------
+class KeyPack:
+    """mmap 读取打包文件；按序号 O(1) 取私钥 / 公钥（HD 模式按序号派生）"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        self._mm = None
+        # 空文件无法 mmap（ValueError）；头部都没写完的文件一并按无效处理
+        if os.fstat(self._f.fileno()).st_size < HEADER.size:
+            self.close()
+            raise KeyPackError(f"{path} 不是有效的打包文件")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < HEADER.size:
+            self.close()
+            raise KeyPackError(f"{path} 不是有效的打包文件")
+        magic, version, rec, self.flags, self.count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION or rec != RECORD_SIZE:
+            self.close()
+            raise KeyPackError(f"{path} 头部不匹配")
+        self.hd_seed = None
+        self._root = None
+        if self.flags & FLAG_HD:
+            self.hd_seed = self._mm[HEADER.size:HEADER.size + SEED_LEN]
+            if len(self.hd_seed) != SEED_LEN:
+                self.close()
+                raise KeyPackError(f"{path} 缺少主种子")
+            self._root = account_root(self.hd_seed)
+        else:
+            # 只信任已提交的记录
+            self.count = min(self.count, (len(self._mm) - HEADER.size) // RECORD_SIZE)
+
+    def __len__(self):
+        return self.count
+
+    def secret(self, i: int) -> bytes:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        if self._root:
+            return derive_secret(self._root, i)
+        off = HEADER.size + i * RECORD_SIZE
+        return self._mm[off:off + RECORD_SIZE]
+
+    def pubkey(self, i: int) -> str:
+        return base58.b58encode(self.secret(i)[32:]).decode()
+
+    def iter_secrets(self, start: int = 0, stop: int = None):
+        """➜ (序号, 64 字节私钥)"""
+        stop = self.count if stop is None else min(stop, self.count)
+        if self._root:
+            for i in range(start, stop):
+                yield i, derive_secret(self._root, i)
+            return
+        for i in range(start, stop):
+            off = HEADER.size + i * RECORD_SIZE
+            yield i, self._mm[off:off + RECORD_SIZE]
+
+    def close(self):
+        if getattr(self, "_mm", None) is not None:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# ---------- solana-keygen 兼容文件（按需生成） ----------
+def keygen_entries(pack: KeyPack, start: int = 0, stop: int = None):
+    """➜ (文件名, 内容 bytes)，与旧版逐钱包输出的两个 JSON 文件一致"""
+    for i, secret in pack.iter_secrets(start, stop):
+        secret_list = list(secret)
+        yield f"wallet_{i}.json", json.dumps(secret_list).encode()
+        yield f"wallet_{i}_info.json", json.dumps({
+            "secret_key"        : secret_list,
+            "secret_key_base58" : base58.b58encode(secret).decode(),
+            "public_key"        : base58.b58encode(secret[32:]).decode()
+        }, indent=2).encode()
+
+
+def export_keygen_files(pack: KeyPack, out_dir: str) -> int:
+    """把打包文件展开成逐钱包 JSON 文件，返回钱包数"""
+    os.makedirs(out_dir, exist_ok=True)
+    for name, data in keygen_entries(pack):
+        with open(os.path.join(out_dir, name), "wb") as f:
+            f.write(data)
+    return len(pack)
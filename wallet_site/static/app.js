@@ -313,6 +313,9 @@ if (genForm) {
     }
 
     const fd = Object.fromEntries(new FormData(e.target).entries());
+    if (!fd.procs) delete fd.procs;  // 留空 → 服务端自动取 CPU 核数
+    if (!fd.vanity_prefix) delete fd.vanity_prefix;
+    if (!fd.vanity_suffix) delete fd.vanity_suffix;
     
     // 验证输入
     if (+fd.min_delay > +fd.max_delay) { 
@@ -347,7 +350,12 @@ if (genForm) {
         throw new Error(`服务器错误 (${r.status})`);
       }
       
-      const d = await r.json();
+      const { job_id } = await r.json();
+      const d = await watchJob(job_id);
+      
+      if (d.status !== 'completed') {
+        throw new Error(d.error_message || '生成任务失败');
+      }
       
       if (statusEl) {
         statusEl.innerHTML = `
@@ -359,7 +367,7 @@ if (genForm) {
         `;
       }
       
-      renderPubkeys(d.pubkeys);
+      renderPubkeys(d.pubkeys || []);
       loadHist();
       
     } catch (e) { 
@@ -375,6 +383,44 @@ if (genForm) {
   };
 }
 
+/* ---------- 生成任务进度（WebSocket，断开时退回轮询） ---------- */
+const renderJobProgress = (p) => {
+  if (!statusEl) return;
+  const stage = { queued: '排队中', running: '生成中', completed: '已完成', failed: '失败' }[p.status] || p.status;
+  statusEl.textContent = `⏳ ${stage}：已生成 ${p.generated ?? 0} / 已入库 ${p.persisted ?? 0} / 已打包 ${p.archived ?? 0}（共 ${p.count ?? '?'} 个）`;
+  if (p.attempts) {
+    statusEl.textContent += ` · 靓号尝试 ${p.attempts} 次，${p.rate} 次/秒` + (p.eta != null ? `，预计剩余 ${Math.ceil(p.eta)} 秒` : '');
+  }
+};
+
+const watchJob = (jobId) => new Promise((resolve) => {
+  const progress = { job_id: jobId };
+  const finish = async () => {
+    const r = await authFetch(`/api/jobs/${jobId}`);
+    resolve(r.ok ? await r.json() : { ...progress, status: 'failed' });
+  };
+  const poll = async () => {
+    const r = await authFetch(`/api/jobs/${jobId}`);
+    const d = r.ok ? await r.json() : { status: 'failed' };
+    renderJobProgress(d);
+    if (d.status === 'completed' || d.status === 'failed') resolve(d);
+    else setTimeout(poll, 2000);
+  };
+
+  const proto = location.protocol === 'https:' ? 'wss' : 'ws';
+  const ws = new WebSocket(`${proto}://${location.host}/ws/jobs/${jobId}?token=${encodeURIComponent(JWT)}`);
+  let done = false;
+  ws.onmessage = (ev) => {
+    Object.assign(progress, JSON.parse(ev.data));
+    renderJobProgress(progress);
+    if (progress.status === 'completed' || progress.status === 'failed') {
+      done = true;
+      finish();
+    }
+  };
+  ws.onclose = () => { if (!done) { done = true; poll(); } };
+});
+
 const renderPubkeys = (arr) => {
   if (!resultEl) return;
   
@@ -462,7 +508,7 @@ const loadHist = async () => {
             <tr>
               <td>${i + 1}</td>
               <td>${new Date(job.created).toLocaleString()}</td>
-              <td><strong>${job.count}</strong> 个</td>
+              <td><strong>${job.count}</strong> 个${job.status && job.status !== 'completed' ? `（${job.status}）` : ''}</td>
               <td>
                 <a href="#" onclick="downloadJob('${job.job_id}'); return false;" 
                    style="color: var(--accent-color); text-decoration: none;">
@@ -480,7 +526,72 @@ const loadHist = async () => {
 };
 
 /* ---------- 钱包管理 ---------- */
-const loadWallets = async () => {
+const WALLET_PAGE_SIZE = 100;
+let walletNextCursor = null;
+
+// 读取筛选条件（空值不传）
+const walletFilterParams = () => {
+  const params = {};
+  const source = $('#walletFilterSource')?.value;
+  const name = $('#walletFilterName')?.value.trim();
+  const minBalance = $('#walletFilterMin')?.value;
+  const maxBalance = $('#walletFilterMax')?.value;
+  if (source) params.source = source;
+  if (name) params.name = name;
+  if (minBalance !== undefined && minBalance !== '') params.min_balance = minBalance;
+  if (maxBalance !== undefined && maxBalance !== '') params.max_balance = maxBalance;
+  return params;
+};
+
+// 取一页钱包 ➜ { items, next_cursor }
+const fetchWalletPage = async (params = {}) => {
+  const qs = new URLSearchParams(params).toString();
+  const r = await authFetch('/api/wallets' + (qs ? `?${qs}` : ''));
+  if (!r.ok) throw new Error('获取钱包列表失败');
+  return r.json();
+};
+
+// 按游标翻完所有页（转账页的钱包选择器需要全部钱包）
+const fetchAllWallets = async () => {
+  const wallets = [];
+  let cursor = null;
+  do {
+    const page = await fetchWalletPage({ limit: 1000, ...(cursor ? { cursor } : {}) });
+    wallets.push(...page.items);
+    cursor = page.next_cursor;
+  } while (cursor);
+  return wallets;
+};
+
+const walletRowHtml = (w) => `
+  <tr>
+    <td><input type="checkbox" class="wallet-select" value="${w.id}"></td>
+    <td style="font-family: monospace; font-size: 12px; max-width: 200px; overflow: hidden; text-overflow: ellipsis;">
+      ${w.public_key}
+    </td>
+    <td>
+      <span class="wallet-name" data-id="${w.id}" title="点击编辑名称">
+        ${w.name || '-'}
+      </span>
+    </td>
+    <td>
+      <span style="padding: 2px 6px; border-radius: 4px; font-size: 11px; 
+            background: ${w.source === 'generated' ? '#e3f2fd' : '#fff3e0'}; 
+            color: ${w.source === 'generated' ? '#1976d2' : '#f57c00'};">
+        ${w.source === 'generated' ? '生成' : '导入'}
+      </span>
+    </td>
+    <td style="font-family: monospace; font-weight: 500; color: var(--success-color);">
+      ${w.balance !== null ? w.balance.toFixed(4) : '-'}
+    </td>
+    <td style="font-size: 12px; color: var(--text-secondary);">
+      ${new Date(w.created).toLocaleString()}
+    </td>
+  </tr>
+`;
+
+// append=true 时加载下一页并追加到表格末尾
+const loadWallets = async (append = false) => {
   if (!walletListEl) return;
   
   if (!JWT) { 
@@ -493,13 +604,14 @@ const loadWallets = async () => {
   if (walletActionsEl) walletActionsEl.style.display = 'flex';
   
   try {
-    const r = await authFetch('/api/wallets');
-    if (!r.ok) {
-      throw new Error('获取钱包列表失败');
-    }
+    const params = { limit: WALLET_PAGE_SIZE, ...walletFilterParams() };
+    if (append && walletNextCursor) params.cursor = walletNextCursor;
+    const page = await fetchWalletPage(params);
+    walletNextCursor = page.next_cursor;
     
-    const wallets = await r.json();
+    const wallets = append ? userWallets.concat(page.items) : page.items;
     userWallets = wallets; // 保存到全局变量
+    window.userWallets = userWallets;
     
     if (wallets.length === 0) {
       walletListEl.innerHTML = '<p class="muted">暂无钱包，请生成或导入钱包</p>';
@@ -519,45 +631,37 @@ const loadWallets = async () => {
           </tr>
         </thead>
         <tbody>
-          ${wallets.map(w => `
-            <tr>
-              <td><input type="checkbox" class="wallet-select" value="${w.id}"></td>
-              <td style="font-family: monospace; font-size: 12px; max-width: 200px; overflow: hidden; text-overflow: ellipsis;">
-                ${w.public_key}
-              </td>
-              <td>
-                <span class="wallet-name" data-id="${w.id}" title="点击编辑名称">
-                  ${w.name || '-'}
-                </span>
-              </td>
-              <td>
-                <span style="padding: 2px 6px; border-radius: 4px; font-size: 11px; 
-                      background: ${w.source === 'generated' ? '#e3f2fd' : '#fff3e0'}; 
-                      color: ${w.source === 'generated' ? '#1976d2' : '#f57c00'};">
-                  ${w.source === 'generated' ? '生成' : '导入'}
-                </span>
-              </td>
-              <td style="font-family: monospace; font-weight: 500; color: var(--success-color);">
-                ${w.balance !== null ? w.balance.toFixed(4) : '-'}
-              </td>
-              <td style="font-size: 12px; color: var(--text-secondary);">
-                ${new Date(w.created).toLocaleString()}
-              </td>
-            </tr>
-          `).join('')}
+          ${wallets.map(walletRowHtml).join('')}
         </tbody>
       </table>
+      ${walletNextCursor ? `
+        <div style="text-align: center; margin-top: 12px;">
+          <button id="walletLoadMore" class="action-btn">加载更多（已显示 ${wallets.length} 个）</button>
+        </div>
+      ` : ''}
     `;
     
+    const loadMoreBtn = $('#walletLoadMore');
+    if (loadMoreBtn) loadMoreBtn.onclick = () => loadWallets(true);
+    
     // 绑定事件
     setupWalletTableEvents();
     
+    // 恢复选中状态
+    selectedWallets.forEach(id => {
+      const checkbox = $(`.wallet-select[value="${id}"]`);
+      if (checkbox) checkbox.checked = true;
+    });
+    
   } catch (e) {
     console.error('加载钱包失败:', e);
     alertMsg('加载钱包列表失败: ' + e.message);
   }
 };
 
+const walletFilterBtn = $('#walletFilterBtn');
+if (walletFilterBtn) walletFilterBtn.onclick = () => loadWallets();
+
 const setupWalletTableEvents = () => {
   // 全选功能
   const selectAllCheckbox = $('#selectAll');
@@ -1217,15 +1321,13 @@ const loadTransferFee = async () => {
 // 加载用户钱包列表
 const loadUserWalletsForTransfer = async () => {
   try {
-    const r = await authFetch('/api/wallets');
-    if (r.ok) {
-      const wallets = await r.json();
-      userWallets = wallets;
-      
-      // 更新自定义钱包选择器
-      if (fromWalletSelectorInstance) {
-        fromWalletSelectorInstance.setWallets(wallets);
-      }
+    const wallets = await fetchAllWallets();
+    userWallets = wallets;
+    window.userWallets = userWallets;
+    
+    // 更新自定义钱包选择器
+    if (fromWalletSelectorInstance) {
+      fromWalletSelectorInstance.setWallets(wallets);
     }
   } catch (e) {
     console.error('加载钱包失败:', e);
@@ -1730,7 +1832,42 @@ const displayBatchPreview = (result) => {
 };
 
 /* ---------- 转账记录管理 ---------- */
-const loadTransferRecords = async () => {
+const RECORD_PAGE_SIZE = 20;
+let transferRecordsCache = [];
+let recordNextCursor = null;
+
+// 读取转账记录筛选条件（空值不传）；日期按本地时区换算，结束日期包含当天
+const recordFilterParams = () => {
+  const params = {};
+  const status = $('#recordFilterStatus')?.value;
+  const address = $('#recordFilterAddress')?.value.trim();
+  const batchId = $('#recordFilterBatch')?.value.trim();
+  const start = $('#recordFilterStart')?.value;
+  const end = $('#recordFilterEnd')?.value;
+  if (status) params.status = status;
+  if (address) params.address = address;
+  if (batchId) params.batch_id = batchId;
+  if (start) params.start = new Date(`${start}T00:00:00`).toISOString();
+  if (end) {
+    const d = new Date(`${end}T00:00:00`);
+    d.setDate(d.getDate() + 1);
+    params.end = d.toISOString();
+  }
+  return params;
+};
+
+const displayTransferSummary = (summary) => {
+  const summaryEl = $('#transferSummary');
+  if (!summaryEl || !summary) return;
+  const by = summary.by_status || {};
+  const count = (s) => (by[s] ? by[s].count : 0);
+  summaryEl.textContent =
+    `共 ${summary.count} 笔，金额 ${summary.amount.toFixed(6)} SOL，手续费 ${summary.fees.toFixed(6)} SOL` +
+    `（已确认 ${count('confirmed')} / 待确认 ${count('pending')} / 失败 ${count('failed')}）`;
+};
+
+// append=true 时加载下一页追加显示；首页同时取筛选结果汇总
+const loadTransferRecords = async (append = false) => {
   const transferRecordsEl = $('#transferRecords');
   if (!transferRecordsEl) return;
   
@@ -1740,13 +1877,31 @@ const loadTransferRecords = async () => {
   }
   
   try {
-    const response = await authFetch('/api/transfer/records?limit=20');
+    const params = { limit: RECORD_PAGE_SIZE, ...recordFilterParams() };
+    if (append && recordNextCursor) {
+      params.cursor = recordNextCursor;
+    } else {
+      params.summary = 'true';
+    }
+    const response = await authFetch('/api/transfer/records?' + new URLSearchParams(params));
     if (!response.ok) {
       throw new Error('获取转账记录失败');
     }
     
-    const records = await response.json();
-    displayTransferRecords(records);
+    const page = await response.json();
+    recordNextCursor = page.next_cursor;
+    transferRecordsCache = append ? transferRecordsCache.concat(page.items) : page.items;
+    if (page.summary) displayTransferSummary(page.summary);
+    displayTransferRecords(transferRecordsCache);
+    
+    if (recordNextCursor) {
+      transferRecordsEl.insertAdjacentHTML('beforeend', `
+        <div style="text-align: center; margin-top: 12px;">
+          <button id="recordLoadMore" class="action-btn">加载更多（已显示 ${transferRecordsCache.length} 条）</button>
+        </div>
+      `);
+      $('#recordLoadMore').onclick = () => loadTransferRecords(true);
+    }
     
   } catch (error) {
     console.error('加载转账记录失败:', error);
@@ -1754,6 +1909,9 @@ const loadTransferRecords = async () => {
   }
 };
 
+const recordFilterBtn = $('#recordFilterBtn');
+if (recordFilterBtn) recordFilterBtn.onclick = () => loadTransferRecords();
+
 const displayTransferRecords = (records) => {
   const recordsEl = $('#transferRecords');
   if (!recordsEl) return;
@@ -1853,7 +2011,9 @@ const displayTransferRecords = (records) => {
     </table>
   `;
   
-  // 绑定复制签名功能
+  // 绑定复制签名功能（表格会反复重绘，监听只绑定一次）
+  if (recordsEl.dataset.copyBound) return;
+  recordsEl.dataset.copyBound = '1';
   recordsEl.addEventListener('click', (e) => {
     if (e.target.classList.contains('copy')) {
       const signature = e.target.dataset.sig;
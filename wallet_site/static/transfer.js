@@ -668,8 +668,8 @@ async function loadTransferRecords() {
   try {
     const response = await window.authFetch('/api/transfer/records?limit=20');
     if (response.ok) {
-      const records = await response.json();
-      displayTransferRecords(records);
+      const page = await response.json();
+      displayTransferRecords(page.items);
     }
   } catch (error) {
     console.error('加载转账记录失败:', error);
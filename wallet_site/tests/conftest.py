@@ -0,0 +1,35 @@
+# 测试共用：临时数据库 / 任务目录，必须在导入 app.* 之前设置环境变量
+# 运行：在 wallet_site 目录下 python -m pytest tests（app/main.py 按相对路径挂载 static）
+import os
+import tempfile
+
+_TMP = tempfile.mkdtemp(prefix="wallet_site_tests_")
+os.environ.setdefault("WALLET_DB_URL", f"sqlite:///{_TMP}/test.db")
+os.environ.setdefault("WALLET_JOB_DIR", _TMP)
+
+import pytest
+from solders.keypair import Keypair
+
+from app.migrations import upgrade
+
+upgrade()   # 导入 app.service 时只核对版本，这里先建好表
+
+
+@pytest.fixture
+def user() -> str:
+    """每个测试一个新用户"""
+    from app.auth import upsert_user
+    owner = str(Keypair().pubkey())
+    upsert_user(owner)
+    return owner
+
+
+@pytest.fixture
+def client(user):
+    """未启动 lifespan 的 TestClient（不跑后台任务），附带该用户的认证头"""
+    from fastapi.testclient import TestClient
+    from app.main import app
+    from app.auth import gen_jwt
+    c = TestClient(app)
+    c.headers["Authorization"] = "Bearer " + gen_jwt(user)
+    return c
@@ -0,0 +1,33 @@
+# HD 派生：与 solders 的 Keypair.from_seed_and_derivation_path 对照
+import os
+
+from solders.keypair import Keypair
+
+from hdkeys import SEED_LEN, SOLANA_PATH, account_root, derive_secret, derive_secrets
+from keypack import KeyPack, KeyPackWriter, pack_path
+
+INDEXES = [0, 1, 2, 7, 100, 2**31 - 1]
+
+
+def _reference(seed: bytes, index: int) -> bytes:
+    return bytes(Keypair.from_seed_and_derivation_path(seed, SOLANA_PATH.format(index=index)))
+
+
+def test_derivation_matches_solders():
+    for seed in (bytes(range(SEED_LEN)), os.urandom(SEED_LEN)):
+        root = account_root(seed)
+        for index in INDEXES:
+            assert derive_secret(root, index) == _reference(seed, index)
+        assert derive_secrets(seed, INDEXES) == [_reference(seed, i) for i in INDEXES]
+
+
+def test_hd_pack_derives_same_keys(tmp_path):
+    seed = os.urandom(SEED_LEN)
+    path = pack_path(tmp_path)
+    with KeyPackWriter(path, hd_seed=seed) as writer:
+        writer.advance(5)
+    with KeyPack(path) as pack:
+        assert len(pack) == 5
+        assert pack.hd_seed == seed
+        assert [s for _, s in pack.iter_secrets()] == [_reference(seed, i) for i in range(5)]
+        assert pack.pubkey(3) == str(Keypair.from_bytes(_reference(seed, 3)).pubkey())
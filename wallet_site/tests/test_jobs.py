@@ -0,0 +1,25 @@
+# 任务认领：只让被认领任务所属用户的任务列表缓存失效
+import uuid
+from datetime import datetime, timedelta
+
+from solders.keypair import Keypair
+
+from app.auth import upsert_user
+from app.cache import job_cache
+from app.service import add_job, claim_job, list_jobs_by_user
+
+
+def test_claim_invalidates_only_owner_cache(user):
+    other = str(Keypair().pubkey())
+    upsert_user(other)
+    job_id = uuid.uuid4().hex[:8]
+    add_job(job_id, "/nonexistent", 10, {}, user, status="queued")
+    list_jobs_by_user(user)
+    list_jobs_by_user(other)
+
+    assert claim_job(job_id, datetime.utcnow() - timedelta(minutes=5))
+    assert job_cache.get(other, ("list_jobs_by_user", (), ()))[0]
+    assert not job_cache.get(user, ("list_jobs_by_user", (), ()))[0]
+    assert list_jobs_by_user(user)[0].status == "running"
+    # 已在运行且租约未过期：认领失败
+    assert not claim_job(job_id, datetime.utcnow() - timedelta(minutes=5))
@@ -0,0 +1,76 @@
+# 打包文件：往返读写、续写时丢弃未提交的记录、空文件
+import os
+
+import base58
+import pytest
+
+from keypack import (KeyPack, KeyPackWriter, KeyPackError, HEADER, RECORD_SIZE,
+                     keygen_entries, pack_path)
+
+
+def _records(n: int) -> bytes:
+    return os.urandom(n * RECORD_SIZE)
+
+
+def _split(data: bytes):
+    return [data[i:i + RECORD_SIZE] for i in range(0, len(data), RECORD_SIZE)]
+
+
+def test_round_trip(tmp_path):
+    path = pack_path(tmp_path)
+    first, second = _records(3), _records(2)
+    with KeyPackWriter(path) as writer:
+        writer.append(first)
+        writer.commit()
+        writer.append(second)
+
+    with KeyPack(path) as pack:
+        assert len(pack) == 5
+        assert [s for _, s in pack.iter_secrets()] == _split(first + second)
+        assert pack.secret(4) == second[RECORD_SIZE:]
+        assert pack.pubkey(0) == base58.b58encode(first[32:RECORD_SIZE]).decode()
+        assert [s for _, s in pack.iter_secrets(1, 3)] == _split(first)[1:3]
+        with pytest.raises(IndexError):
+            pack.secret(5)
+    assert os.path.getsize(path) == HEADER.size + 5 * RECORD_SIZE
+
+
+def test_resume_drops_uncommitted_records(tmp_path):
+    path = pack_path(tmp_path)
+    committed, lost, resumed = _records(2), _records(3), _records(1)
+    writer = KeyPackWriter(path)
+    writer.append(committed)
+    writer.commit()
+    writer.append(lost)
+    writer._f.flush()
+    writer._f.close()   # 模拟提交前进程退出：数据已写入，头部 count 仍是 2
+
+    with KeyPack(path) as pack:
+        assert len(pack) == 2
+
+    with KeyPackWriter(path, resume=True) as writer:
+        assert writer.count == 2
+        assert os.path.getsize(path) == HEADER.size + 2 * RECORD_SIZE
+        writer.append(resumed)
+
+    with KeyPack(path) as pack:
+        assert [s for _, s in pack.iter_secrets()] == _split(committed + resumed)
+
+
+def test_empty_pack(tmp_path):
+    path = pack_path(tmp_path)
+    with KeyPackWriter(path):
+        pass
+    with KeyPack(path) as pack:
+        assert len(pack) == 0
+        assert list(pack.iter_secrets()) == []
+        assert list(keygen_entries(pack)) == []
+
+
+@pytest.mark.parametrize("content", [b"", b"WKPACK"])
+def test_truncated_file_is_rejected(tmp_path, content):
+    path = pack_path(tmp_path)
+    with open(path, "wb") as f:
+        f.write(content)
+    with pytest.raises(KeyPackError):
+        KeyPack(path)
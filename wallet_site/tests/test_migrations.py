@@ -0,0 +1,80 @@
+# 迁移：按最初版本的表结构建库、写入数据，升级到最新后检查数据和索引
+from sqlalchemy import inspect, text
+
+from app.db import make_engine
+from app.migrations import upgrade, current_version, LATEST_VERSION
+
+# 引入 migrations 之前的表结构（只列迁移会动到的表）
+BASELINE_DDL = [
+    "CREATE TABLE user (wallet VARCHAR NOT NULL, PRIMARY KEY (wallet))",
+    """CREATE TABLE job (
+        id VARCHAR NOT NULL, owner VARCHAR NOT NULL, created DATETIME NOT NULL, params JSON,
+        path VARCHAR NOT NULL, count INTEGER NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(owner) REFERENCES user (wallet))""",
+    """CREATE TABLE wallet (
+        id INTEGER NOT NULL, public_key VARCHAR NOT NULL, owner VARCHAR NOT NULL, name VARCHAR,
+        secret_key VARCHAR NOT NULL, created DATETIME NOT NULL, balance FLOAT, last_checked DATETIME,
+        source VARCHAR NOT NULL,
+        PRIMARY KEY (id), FOREIGN KEY(owner) REFERENCES user (wallet))""",
+    "CREATE INDEX ix_wallet_owner ON wallet (owner)",
+    "CREATE INDEX ix_wallet_public_key ON wallet (public_key)",
+    """CREATE TABLE transferrecord (
+        id INTEGER NOT NULL, owner VARCHAR NOT NULL, from_address VARCHAR NOT NULL,
+        to_address VARCHAR NOT NULL, amount FLOAT NOT NULL, fee FLOAT NOT NULL, memo VARCHAR,
+        signature VARCHAR, status VARCHAR NOT NULL, error_message VARCHAR, created DATETIME NOT NULL,
+        confirmed DATETIME, block_height INTEGER, transfer_type VARCHAR NOT NULL, batch_id VARCHAR,
+        PRIMARY KEY (id), FOREIGN KEY(owner) REFERENCES user (wallet))""",
+    "CREATE INDEX ix_transferrecord_owner ON transferrecord (owner)",
+]
+
+WALLETS = [(1, "pk1", "first", "sk1", 1.5), (2, "pk2", None, "sk2", None), (7, "pk7", "last", "sk7", 0.0)]
+
+
+def _baseline_engine(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path}/legacy.db")
+    with engine.begin() as conn:
+        for ddl in BASELINE_DDL:
+            conn.execute(text(ddl))
+        conn.execute(text("INSERT INTO user VALUES ('alice')"))
+        conn.execute(text("INSERT INTO job VALUES ('j1', 'alice', '2024-01-01 00:00:00', '{}', '/tmp/j1', 3)"))
+        for wid, pk, name, sk, balance in WALLETS:
+            conn.execute(text(
+                "INSERT INTO wallet VALUES (:id, :pk, 'alice', :name, :sk, '2024-01-01 00:00:00', :bal, NULL, 'imported')"),
+                {"id": wid, "pk": pk, "name": name, "sk": sk, "bal": balance})
+        conn.execute(text(
+            "INSERT INTO transferrecord VALUES (1, 'alice', 'pk1', 'x', 1.0, 0.000005, NULL, 'sig', "
+            "'confirmed', NULL, '2024-01-02 00:00:00', NULL, NULL, 'batch', 'b1')"))
+    return engine
+
+
+def test_upgrade_baseline_database(tmp_path):
+    engine = _baseline_engine(tmp_path)
+    assert current_version(engine) == 0
+    assert upgrade(engine) == list(range(1, LATEST_VERSION + 1))
+    assert current_version(engine) == LATEST_VERSION
+    assert upgrade(engine) == []
+
+    with engine.connect() as conn:
+        # 私钥搬到 walletkey，wallet 行原样保留
+        assert conn.execute(text(
+            "SELECT id, public_key, name, balance, source FROM wallet ORDER BY id")).all() == [
+            (wid, pk, name, balance, "imported") for wid, pk, name, _, balance in WALLETS]
+        assert conn.execute(text(
+            "SELECT wallet_id, secret_key FROM walletkey ORDER BY wallet_id")).all() == [
+            (wid, sk) for wid, _, _, sk, _ in WALLETS]
+        # 旧任务视为已完成
+        assert conn.execute(text("SELECT status, generated, persisted FROM job")).one() == ("completed", 0, 0)
+        assert conn.execute(text("SELECT signature FROM transferrecord")).scalar() == "sig"
+        # 重建 wallet 后外键仍指向 wallet（不是改名后的 wallet_old），且没有悬空引用
+        assert conn.execute(text("PRAGMA foreign_key_check")).all() == []
+        assert "wallet_old" not in conn.execute(text(
+            "SELECT sql FROM sqlite_master WHERE name = 'walletkey'")).scalar()
+
+    insp = inspect(engine)
+    assert "secret_key" not in {c["name"] for c in insp.get_columns("wallet")}
+    assert {"ix_wallet_owner", "ix_wallet_public_key", "ix_wallet_owner_created_id"} <= {
+        i["name"] for i in insp.get_indexes("wallet")}
+    assert {"ix_transferrecord_owner", "ix_transfer_owner_created_id", "ix_transfer_batch_status",
+            "ix_transfer_status_created"} <= {i["name"] for i in insp.get_indexes("transferrecord")}
+    assert "ix_transfer_archive_owner_created_id" in {
+        i["name"] for i in insp.get_indexes("transferrecordarchive")}
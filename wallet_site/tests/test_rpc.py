@@ -0,0 +1,58 @@
+# RPC 路由：用 httpx.MockTransport 做桩端点，不访问网络
+# 运行：在 wallet_site 目录下 python -m pytest tests
+import json
+import time
+import asyncio
+import httpx
+
+from app.rpc import SolanaRpc
+
+
+def _stub(sent: list, status: int = 200, headers: dict = None):
+    """记录每个请求的 (时间, 主机)，按 JSON-RPC 返回固定余额"""
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append((time.monotonic(), request.url.host))
+        if status != 200:
+            return httpx.Response(status, headers=headers or {})
+        body = json.loads(request.content)
+        answer = lambda req: {"jsonrpc": "2.0", "id": req["id"],
+                              "result": {"context": {"slot": 1}, "value": 1}}
+        return httpx.Response(200, json=[answer(r) for r in body] if isinstance(body, list) else answer(body))
+    return httpx.MockTransport(handler)
+
+
+def test_rate_budget_holds_under_concurrency():
+    """15 个并发请求、预算 5/s：突发 5 个，其余按 5/s 发出，约 2 秒"""
+    sent = []
+    rpc = SolanaRpc(["http://c|5"], transport=_stub(sent))
+
+    async def run():
+        await asyncio.gather(*(rpc.get_balance("abc") for _ in range(15)))
+        await rpc.close()
+
+    started = time.monotonic()
+    asyncio.run(run())
+    assert len(sent) == 15
+    assert time.monotonic() - started >= 1.8
+    # 任意 1 秒窗口内不超过 突发 + 速率
+    times = [t for t, _ in sent]
+    for t in times:
+        assert sum(1 for u in times if t <= u < t + 1.0) <= 5 + 5
+
+
+def test_failover_on_429():
+    """被限流的端点进入冷却，请求转到另一个端点"""
+    sent = []
+    limited = _stub(sent, status=429, headers={"Retry-After": "30"})
+    healthy = _stub(sent)
+    transport = httpx.MockTransport(
+        lambda request: (limited if request.url.host == "a" else healthy).handle_request(request))
+    rpc = SolanaRpc(["http://a", "http://b"], transport=transport)
+
+    async def run():
+        results = [await rpc.get_balance("abc") for _ in range(5)]
+        await rpc.close()
+        return results
+
+    assert asyncio.run(run()) == [1] * 5
+    assert [host for _, host in sent].count("a") == 1
@@ -0,0 +1,84 @@
+# 转账接口：只走余额缓存 / 数据库，不访问 RPC
+from datetime import datetime
+
+from solders.keypair import Keypair
+
+from app.transfer_service import TransferService
+from app.wallet_service import add_wallet, save_balances
+
+
+def _own_wallet(owner: str, balance: float) -> str:
+    """给用户加一个余额缓存仍然有效的钱包"""
+    kp = Keypair()
+    wallet = add_wallet(str(kp.pubkey()), str(kp), owner)
+    save_balances([{"id": wallet.id, "balance": balance, "last_checked": datetime.utcnow()}], owner)
+    return wallet.public_key
+
+
+def test_validate_own_address_uses_balance_cache(client, user):
+    address = _own_wallet(user, 1.5)
+    r = client.post("/api/transfer/validate-address", json={"address": address})
+    assert r.status_code == 200
+    assert r.json() == {"valid": True, "balance": 1.5}
+
+
+def _batch(owner: str, n: int):
+    task = TransferService.create_batch_transfer_task(owner, "x", 1.0, n, float(n), 0.0)
+    records = TransferService.create_transfer_records([
+        dict(owner=owner, from_address=f"a{i}", to_address="b", amount=1.0, fee=0.0,
+             transfer_type="batch", batch_id=task.id) for i in range(n)])
+    return task.id, [r.id for r in records]
+
+
+def test_batch_counters_consistent_between_confirm_and_status(client, user):
+    batch_id, ids = _batch(user, 3)
+    results = [{"transfer_id": ids[0], "signature": "s0"},
+               {"transfer_id": ids[1], "error": "rejected"},
+               {"transfer_id": ids[2], "signature": "s2"}]
+    confirm = client.post("/api/transfer/batch-confirm",
+                          json={"batch_id": batch_id, "results": results}).json()
+    assert (confirm["successful_transfers"], confirm["failed_transfers"], confirm["status"]) == (2, 1, "processing")
+
+    status = client.get(f"/api/transfer/batch/{batch_id}").json()
+    assert (status["successful_transfers"], status["failed_transfers"]) == (2, 1)
+    assert (status["confirmed_transfers"], status["status"], status["completed"]) == (0, "processing", None)
+
+    TransferService.mark_signature_status(user, "s0", "confirmed")
+    TransferService.mark_signature_status(user, "s2", "confirmed")
+    status = client.get(f"/api/transfer/batch/{batch_id}").json()
+    assert (status["successful_transfers"], status["confirmed_transfers"]) == (2, 2)
+    assert status["status"] == "partially_completed"
+    assert status["completed"] is not None
+
+
+def test_batch_confirm_checks_batch_owner_and_membership(client, user):
+    from app.auth import upsert_user
+    other = str(Keypair().pubkey())
+    upsert_user(other)
+    foreign_batch, _ = _batch(other, 1)
+    for batch_id in ("no-such-batch", foreign_batch):
+        r = client.post("/api/transfer/batch-confirm", json={"batch_id": batch_id, "results": []})
+        assert r.status_code == 404
+
+    batch_id, ids = _batch(user, 1)
+    _, outside = _batch(user, 1)   # 同一用户另一个批次的记录
+    results = [{"transfer_id": ids[0], "signature": "in"}, {"transfer_id": outside[0], "signature": "out"}]
+    r = client.post("/api/transfer/batch-confirm", json={"batch_id": batch_id, "results": results})
+    assert r.json()["successful_transfers"] == 1
+    records, _ = TransferService.list_transfer_records(user, batch_id=batch_id)
+    assert [rec["signature"] for rec in records] == ["in"]
+    assert TransferService.mark_signature_status(user, "out", "confirmed") == 0
+
+
+def test_fee_estimate_makes_no_rpc_call(client, monkeypatch):
+    from app import transfer_service
+    calls = []
+
+    async def fake_call(*args, **kwargs):
+        calls.append(args)
+
+    monkeypatch.setattr(transfer_service.rpc, "call", fake_call)
+    monkeypatch.setattr(transfer_service.rpc, "batch", fake_call)
+    r = client.get("/api/transfer/fee")
+    assert r.json() == {"fee": 0.000005, "fee_lamports": 5000}
+    assert calls == []
@@ -0,0 +1,47 @@
+# 靓号匹配：整数区间 / 取模判断必须与 base58 编码后的前缀 / 后缀比较一致
+import random
+
+import base58
+from solders.keypair import Keypair
+
+from bulk_generate import VanityPattern, _vanity_chunk, SECRET_LEN
+
+
+def _pubkeys(n: int, seed: int = 7):
+    """随机公钥，另外覆盖首字节很小（43 位地址）和首字节为 0（前导 '1'）的情况"""
+    rng = random.Random(seed)
+    keys = [rng.randbytes(32) for _ in range(n)]
+    keys += [bytes([b]) + rng.randbytes(31) for b in (0, 0, 1, 2, 3, 0x80, 0xFF) for _ in range(20)]
+    keys += [bytes(2) + rng.randbytes(30) for _ in range(10)]
+    return keys
+
+
+def _patterns(keys):
+    """取部分公钥地址的头尾做模式，保证有命中；再加几个固定模式"""
+    rng = random.Random(1)
+    patterns = {("So", ""), ("", "z"), ("A", "9"), ("1", ""), ("11", ""), ("zz", ""), ("", "11")}
+    for pk in rng.sample(keys, 40):
+        addr = base58.b58encode(pk).decode()
+        k = rng.randint(1, 3)
+        patterns |= {(addr[:k], ""), ("", addr[-k:]), (addr[:k], addr[-k:])}
+    return patterns
+
+
+def test_matches_agrees_with_base58():
+    keys = _pubkeys(800)
+    addresses = [(pk, base58.b58encode(pk).decode()) for pk in keys]
+    for prefix, suffix in _patterns(keys):
+        pattern = VanityPattern(prefix, suffix)
+        for pk, addr in addresses:
+            expected = addr.startswith(prefix) and addr.endswith(suffix)
+            assert pattern.matches(pk) == expected, (prefix, suffix, addr)
+
+
+def test_vanity_chunk_returns_matching_secrets():
+    pattern = VanityPattern("", "a")
+    data = _vanity_chunk(pattern, 2000)
+    assert data and len(data) % SECRET_LEN == 0
+    for off in range(0, len(data), SECRET_LEN):
+        secret = data[off:off + SECRET_LEN]
+        kp = Keypair.from_bytes(secret)   # 私钥与公钥一致
+        assert str(kp.pubkey()).endswith("a")
@@ -0,0 +1,25 @@
+# 钱包导出：缺少密钥的钱包单独报错，其它照常导出
+from sqlalchemy import delete
+from solders.keypair import Keypair
+
+from app.db import get_session
+from app.models import WalletKey
+from app.wallet_service import add_wallet, import_wallets_from_json
+
+
+def test_export_reports_wallet_without_key(client, user):
+    keys = [Keypair() for _ in range(2)]
+    wallets = [add_wallet(str(kp.pubkey()), str(kp), user) for kp in keys]
+    with get_session() as session:
+        session.execute(delete(WalletKey).where(WalletKey.wallet_id == wallets[1].id))
+        session.commit()
+
+    r = client.post("/api/wallets/export", json=[w.id for w in wallets])
+    assert r.status_code == 200
+    by_key = {item["public_key"]: item for item in r.json()}
+    assert bytes(by_key[str(keys[0].pubkey())]["secret_key"]) == bytes(keys[0])
+    assert by_key[str(keys[1].pubkey())]["status"] == "error"
+    assert "secret_key" not in by_key[str(keys[1].pubkey())]
+
+    # 导出文件可以原样再导入：报错条目被跳过
+    assert [item["status"] for item in import_wallets_from_json(r.text, user)] == ["success"]
@@ -0,0 +1,33 @@
+# 任务进度 WebSocket：客户端断开后服务端及时退订
+# 直接驱动 ASGI 应用：TestClient 退出时会取消服务端协程，测不出“只收到 disconnect 消息”的情况
+import asyncio
+import uuid
+
+from app.auth import gen_jwt
+from app.jobs import hub
+from app.main import app
+from app.service import add_job
+
+
+def test_disconnect_while_job_idle_unsubscribes(user):
+    job_id = uuid.uuid4().hex[:8]
+    add_job(job_id, "/nonexistent", 10, {}, user, status="queued")   # 没有工作线程，不会再有进度事件
+    scope = {
+        "type": "websocket", "asgi": {"version": "3.0"}, "scheme": "ws",
+        "path": f"/ws/jobs/{job_id}", "raw_path": f"/ws/jobs/{job_id}".encode(), "root_path": "",
+        "query_string": f"token={gen_jwt(user)}".encode(), "headers": [],
+        "server": ("testserver", 80), "client": ("testclient", 50000), "subprotocols": [],
+    }
+
+    async def run():
+        inbox, outbox = asyncio.Queue(), asyncio.Queue()
+        await inbox.put({"type": "websocket.connect"})
+        handler = asyncio.create_task(app(scope, inbox.get, outbox.put))
+        assert (await outbox.get())["type"] == "websocket.accept"
+        assert '"queued"' in (await outbox.get())["text"]
+        assert hub._subs.get(job_id)
+        await inbox.put({"type": "websocket.disconnect", "code": 1001})
+        await asyncio.wait_for(handler, 2)
+
+    asyncio.run(run())
+    assert not hub._subs.get(job_id)
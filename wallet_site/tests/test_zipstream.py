@@ -0,0 +1,40 @@
+# 流式 zip：产出的字节能被标准库 zipfile 读回
+import io
+import os
+import zipfile
+
+import pytest
+
+from app.zipstream import stream_zip, CHUNK_SIZE
+from keypack import KeyPack, KeyPackWriter, RECORD_SIZE, keygen_entries, pack_path
+
+
+def _read_zip(chunks) -> dict:
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        assert zf.testzip() is None
+        return {info.filename: zf.read(info) for info in zf.infolist()}
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_zip_readable(compress):
+    entries = [("a.json", b"{}"), ("目录/b.bin", os.urandom(3 * CHUNK_SIZE)), ("empty", b"")]
+    assert _read_zip(stream_zip(entries, compress=compress)) == dict(entries)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_zip_from_pack(tmp_path, compress):
+    path = pack_path(tmp_path)
+    with KeyPackWriter(path) as writer:
+        writer.append(os.urandom(4 * RECORD_SIZE))
+    with KeyPack(path) as pack:
+        expected = dict(keygen_entries(pack))
+        assert _read_zip(stream_zip(keygen_entries(pack), compress=compress)) == expected
+    assert len(expected) == 8
+
+
+def test_zip_of_empty_pack(tmp_path):
+    path = pack_path(tmp_path)
+    with KeyPackWriter(path):
+        pass
+    with KeyPack(path) as pack:
+        assert _read_zip(stream_zip(keygen_entries(pack))) == {}